@@ -1,5 +1,13 @@
-from disinfodomains.disinfodomains import generate_report
-
 __all__ = ['generate_report']
 
-__version__ = "0.1.0"
\ No newline at end of file
+__version__ = "0.1.0"
+
+
+def __getattr__(name):
+    # imported on first use, so `import disinfodomains.cli` does not load the report engine
+    if name == "generate_report":
+        from disinfodomains.disinfodomains import generate_report
+
+        return generate_report
+
+    raise AttributeError("module 'disinfodomains' has no attribute " + repr(name))
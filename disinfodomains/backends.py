@@ -0,0 +1,709 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:
+    # Windows; see FilesystemBackend
+    fcntl = None
+
+# day cache keys that hold dictionaries; every other key, such as a domain, holds a list
+DICTIONARY_KEYS = (
+    "last_modified",
+    "known_lists",
+    "categories",
+    "sentiments",
+    "hits",
+    "reports",
+    "revisions",
+    "redirects",
+)
+
+# fields read or written per SQL statement
+SQLITE_BATCH_SIZE = 500
+# writes appended to a day's log before it is folded into the day's JSON file
+FILESYSTEM_COMPACT_ENTRIES = 10000
+# days kept in memory by the filesystem backend; past days are read by consensus and revalidation
+FILESYSTEM_DAYS_IN_MEMORY = 8
+# times a Redis pipeline is sent, on a new connection each time, before its error is raised
+REDIS_ATTEMPTS = 2
+
+
+class CacheBackend:
+    """
+    Storage for day caches.
+
+    Each day maps keys to either a list or a dictionary of fields. Keys in
+    `DICTIONARY_KEYS` hold dictionaries; all other keys hold lists, which are
+    merged as sets.
+
+    Reads take an optional timeout, in seconds, so a report with a deadline does not wait
+    on a slow shared backend; backends that read from local disk ignore it.
+    """
+
+    def list_days(self) -> list:
+        """
+        List every day with a cache, oldest first.
+        """
+        raise NotImplementedError
+
+    def load_day(self, day: str) -> dict:
+        """
+        Read every key saved for a day.
+        """
+        raise NotImplementedError
+
+    def get_fields(self, day: str, key: str, fields: list, timeout: float = None) -> dict:
+        """
+        Read several fields of a dictionary in one request. Missing fields are omitted.
+        """
+        raise NotImplementedError
+
+    def get_values(self, pairs: list, timeout: float = None) -> list:
+        """
+        Read the value of several (day, key) pairs in one request. Missing values are None.
+        """
+        raise NotImplementedError
+
+    def get_many_fields(self, reads: list, timeout: float = None) -> list:
+        """
+        Read fields of several dictionaries, given as (day, key, fields) tuples, in one request.
+
+        Returns the fields found for each read, in order. Backends that read from local
+        disk read them one at a time.
+        """
+        return [self.get_fields(day, key, fields, timeout) for day, key, fields in reads]
+
+    def set_fields(self, day: str, key: str, mapping: dict):
+        """
+        Write several fields of a dictionary in one request.
+        """
+        raise NotImplementedError
+
+    def add_to_list(self, day: str, key: str, items: list):
+        """
+        Add items to a list, ignoring items that are already present.
+        """
+        raise NotImplementedError
+
+    def increment_fields(self, day: str, key: str, counts: dict):
+        """
+        Add to several integer fields of a dictionary in one request.
+        """
+        raise NotImplementedError
+
+
+def apply_operation(cache: dict, operation: str, key: str, value):
+    """
+    Apply a write to a day cache held in memory.
+
+    Args:
+        cache: The day cache.
+        operation: "set" to update fields, "add" to add items to a list or "increment" to add to fields.
+        key: The key written to.
+        value: The fields, items or counts written.
+
+    Returns:
+        None
+    """
+    if operation == "set":
+        cache.setdefault(key, {}).update(value)
+    elif operation == "add":
+        cache[key] = list(set(cache.get(key, [])) | set(value))
+    elif operation == "increment":
+        section = cache.setdefault(key, {})
+
+        for field, count in value.items():
+            section[field] = section.get(field, 0) + count
+
+
+class FilesystemBackend(CacheBackend):
+    """
+    Stores each day as a JSON file. This is the default backend.
+
+    Writes are appended to a log next to the day's JSON file, so a write only costs as
+    much as the data written. The log is folded into the JSON file once it holds
+    `FILESYSTEM_COMPACT_ENTRIES` writes, and when the day is evicted from memory.
+
+    Several processes on one machine may share a directory: appends, reads and compaction
+    take a lock on a `<day>.lock` file, and compaction re-reads the log so entries appended
+    by other processes are kept. File locks need `fcntl`, so on Windows a directory must
+    only be used by one process.
+    """
+
+    def __init__(self, directory: str, days_in_memory: int = FILESYSTEM_DAYS_IN_MEMORY):
+        self.directory = directory
+        self.days_in_memory = days_in_memory
+        # least recently used first
+        self.days = OrderedDict()
+        self.log_entries = {}
+        self.lock = threading.RLock()
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, day: str) -> str:
+        return os.path.join(self.directory, day + ".json")
+
+    def _log_path(self, day: str) -> str:
+        return os.path.join(self.directory, day + ".log")
+
+    @contextmanager
+    def _file_lock(self, day: str, exclusive: bool):
+        if fcntl is None:
+            yield
+            return
+
+        with open(os.path.join(self.directory, day + ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _day(self, day: str) -> dict:
+        if day in self.days:
+            self.days.move_to_end(day)
+            return self.days[day]
+
+        self.days[day] = self.load_day(day)
+
+        while len(self.days) > self.days_in_memory:
+            self._evict(next(iter(self.days)))
+
+        return self.days[day]
+
+    def _evict(self, day: str):
+        if self.log_entries.get(day):
+            self._compact(day)
+
+        del self.days[day]
+        self.log_entries.pop(day, None)
+
+    def _compact(self, day: str):
+        temporary_path = self._path(day) + ".tmp"
+
+        with self._file_lock(day, exclusive=True):
+            # other processes may have appended entries this process has not read
+            self.days[day] = self._read_day(day)
+
+            with open(temporary_path, "w") as f:
+                json.dump(self.days[day], f)
+
+            os.replace(temporary_path, self._path(day))
+
+            if os.path.exists(self._log_path(day)):
+                os.remove(self._log_path(day))
+
+        self.log_entries[day] = 0
+
+    def _append(self, day: str, operation: str, key: str, value):
+        # appends may run side by side, but not while another process compacts the day
+        with self._file_lock(day, exclusive=False), open(self._log_path(day), "a") as f:
+            f.write(json.dumps([operation, key, value]) + "\n")
+
+        self.log_entries[day] = self.log_entries.get(day, 0) + 1
+
+        if self.log_entries[day] >= FILESYSTEM_COMPACT_ENTRIES:
+            self._compact(day)
+
+    def list_days(self) -> list:
+        return sorted(
+            {
+                os.path.splitext(file_name)[0]
+                for file_name in os.listdir(self.directory)
+                if file_name.endswith((".json", ".log"))
+            }
+        )
+
+    def load_day(self, day: str) -> dict:
+        # days with no cache, such as those read by consensus, do not need a lock file
+        if not os.path.exists(self._path(day)) and not os.path.exists(self._log_path(day)):
+            return {}
+
+        with self._file_lock(day, exclusive=False):
+            return self._read_day(day)
+
+    def _read_day(self, day: str) -> dict:
+        cache = {}
+
+        if os.path.exists(self._path(day)):
+            with open(self._path(day), "r") as f:
+                cache = json.load(f)
+
+        if not os.path.exists(self._log_path(day)):
+            return cache
+
+        with open(self._log_path(day), "r") as f:
+            for line in f:
+                try:
+                    operation, key, value = json.loads(line)
+                except ValueError:
+                    # a write cut short by a crash
+                    continue
+
+                apply_operation(cache, operation, key, value)
+
+        return cache
+
+    def get_fields(self, day: str, key: str, fields: list, timeout: float = None) -> dict:
+        with self.lock:
+            section = self._day(day).get(key, {})
+
+            return {field: section[field] for field in fields if field in section}
+
+    def get_values(self, pairs: list, timeout: float = None) -> list:
+        with self.lock:
+            return [self._day(day).get(key) for day, key in pairs]
+
+    def _write(self, day: str, operation: str, key: str, value):
+        with self.lock:
+            apply_operation(self._day(day), operation, key, value)
+            self._append(day, operation, key, value)
+
+    def set_fields(self, day: str, key: str, mapping: dict):
+        self._write(day, "set", key, mapping)
+
+    def add_to_list(self, day: str, key: str, items: list):
+        self._write(day, "add", key, list(items))
+
+    def increment_fields(self, day: str, key: str, counts: dict):
+        self._write(day, "increment", key, counts)
+
+
+def decode_sqlite_value(value):
+    # counters are stored as integers, everything else as JSON
+    return value if isinstance(value, int) else json.loads(value)
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Stores day caches in one SQLite database, so processes on a node share a cache.
+    """
+
+    def __init__(self, path: str):
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "day TEXT NOT NULL, key TEXT NOT NULL, field TEXT NOT NULL, value, "
+                "PRIMARY KEY (day, key, field))"
+            )
+
+    def _read(self, day: str, key: str, fields: list = None):
+        if fields is None:
+            return self.connection.execute(
+                "SELECT field, value FROM cache WHERE day = ? AND key = ?", (day, key)
+            ).fetchall()
+
+        rows = []
+
+        for i in range(0, len(fields), SQLITE_BATCH_SIZE):
+            batch = fields[i : i + SQLITE_BATCH_SIZE]
+
+            rows.extend(
+                self.connection.execute(
+                    "SELECT field, value FROM cache WHERE day = ? AND key = ? AND field IN ("
+                    + ", ".join("?" * len(batch))
+                    + ")",
+                    (day, key, *batch),
+                ).fetchall()
+            )
+
+        return rows
+
+    def _section(self, key: str, rows: list):
+        if key in DICTIONARY_KEYS:
+            return {field: decode_sqlite_value(value) for field, value in rows}
+
+        return [field for field, _ in rows]
+
+    def list_days(self) -> list:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT DISTINCT day FROM cache ORDER BY day"
+            ).fetchall()
+
+        return [day for day, in rows]
+
+    def load_day(self, day: str) -> dict:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT key, field, value FROM cache WHERE day = ?", (day,)
+            ).fetchall()
+
+        cache = {}
+
+        for key, field, value in rows:
+            if key in DICTIONARY_KEYS:
+                cache.setdefault(key, {})[field] = decode_sqlite_value(value)
+            else:
+                cache.setdefault(key, []).append(field)
+
+        return cache
+
+    def get_fields(self, day: str, key: str, fields: list, timeout: float = None) -> dict:
+        with self.lock:
+            rows = self._read(day, key, list(fields))
+
+        return {field: decode_sqlite_value(value) for field, value in rows}
+
+    def get_values(self, pairs: list, timeout: float = None) -> list:
+        with self.lock:
+            sections = [self._read(day, key) for day, key in pairs]
+
+        return [
+            self._section(key, rows) if rows else None
+            for (_, key), rows in zip(pairs, sections)
+        ]
+
+    def set_fields(self, day: str, key: str, mapping: dict):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                [(day, key, field, json.dumps(value)) for field, value in mapping.items()],
+            )
+
+    def add_to_list(self, day: str, key: str, items: list):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO cache VALUES (?, ?, ?, NULL)",
+                [(day, key, item) for item in items],
+            )
+
+    def increment_fields(self, day: str, key: str, counts: dict):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO cache VALUES (?, ?, ?, ?) ON CONFLICT (day, key, field) "
+                "DO UPDATE SET value = CAST(value AS INTEGER) + excluded.value",
+                [(day, key, field, count) for field, count in counts.items()],
+            )
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisConnection:
+    """
+    A minimal client for the Redis serialization protocol that sends commands in pipelines.
+
+    If sending or reading fails, such as when a reply times out, the connection is closed
+    so no late reply is read as the answer to a later command, and a new connection is
+    made for the next attempt.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, timeout: float = 10):
+        self.lock = threading.Lock()
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self.socket = None
+        self.file = None
+
+        with self.lock:
+            self.connect()
+
+    def connect(self, timeout: float = None):
+        self.socket = socket.create_connection(
+            (self.host, self.port), timeout=timeout or self.timeout
+        )
+        self.file = self.socket.makefile("rb")
+
+        if self.db:
+            reply = self._send([("SELECT", self.db)])[0]
+
+            if isinstance(reply, RedisError):
+                raise reply
+
+    def close(self):
+        for connection in (self.file, self.socket):
+            if connection is not None:
+                try:
+                    connection.close()
+                except OSError:
+                    pass
+
+        self.file = None
+        self.socket = None
+
+    def _send(self, commands: list) -> list:
+        self.socket.sendall(b"".join(self._encode(command) for command in commands))
+
+        return [self._read_reply() for _ in commands]
+
+    def _encode(self, command) -> bytes:
+        parts = [b"*%d\r\n" % len(command)]
+
+        for argument in command:
+            if not isinstance(argument, bytes):
+                argument = str(argument).encode("utf-8")
+
+            parts.append(b"$%d\r\n%s\r\n" % (len(argument), argument))
+
+        return b"".join(parts)
+
+    def _read_reply(self):
+        line = self.file.readline()
+
+        if not line:
+            raise ConnectionError("Redis server closed the connection")
+
+        prefix, body = line[:1], line[1:-2]
+
+        if prefix == b"+":
+            return body.decode("utf-8")
+        if prefix == b"-":
+            return RedisError(body.decode("utf-8"))
+        if prefix == b":":
+            return int(body)
+        if prefix == b"$":
+            if int(body) == -1:
+                return None
+
+            data = self.file.read(int(body) + 2)
+            return data[:-2].decode("utf-8")
+        if prefix == b"*":
+            if int(body) == -1:
+                return None
+
+            return [self._read_reply() for _ in range(int(body))]
+
+        raise RedisError("Unexpected reply: " + line.decode("utf-8", "replace"))
+
+    def _timeout(self, expires_at: float = None) -> float:
+        if expires_at is None:
+            return self.timeout
+
+        remaining = expires_at - time.monotonic()
+
+        if remaining <= 0:
+            raise socket.timeout("Redis pipeline timed out")
+
+        return min(self.timeout, remaining)
+
+    def pipeline(self, commands: list, timeout: float = None) -> list:
+        """
+        Send several commands in one write and read every reply.
+
+        A pipeline that fails is sent again on a new connection, up to `REDIS_ATTEMPTS`
+        times. The server may have run the first attempt, so increments may be counted twice.
+
+        Args:
+            commands: A list of commands, each a tuple of arguments.
+            timeout: The most seconds to spend on the pipeline, including waiting for the
+                connection and every attempt, or None to allow `self.timeout` per attempt.
+
+        Returns:
+            The reply to each command, in order.
+
+        Raises:
+            socket.timeout: If `timeout` passes first.
+        """
+        if not commands:
+            return []
+
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+
+        if not self.lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise socket.timeout("Timed out waiting for the Redis connection")
+
+        try:
+            for attempt in range(REDIS_ATTEMPTS):
+                try:
+                    if self.socket is None:
+                        self.connect(self._timeout(expires_at))
+
+                    self.socket.settimeout(self._timeout(expires_at))
+                    replies = self._send(commands)
+                    break
+                except (OSError, RedisError):
+                    self.close()
+
+                    if attempt == REDIS_ATTEMPTS - 1:
+                        raise
+        finally:
+            self.lock.release()
+
+        # replies are read in full first so the connection stays in sync
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+
+        return replies
+
+
+class RedisBackend(CacheBackend):
+    """
+    Stores day caches on a Redis-compatible server, so every node shares one cache.
+
+    Lists are stored as sets and dictionaries as hashes with JSON values.
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6379,
+        db: int = 0,
+        prefix: str = "disinfo-domains",
+        expire_after: int = None,
+    ):
+        self.connection = RedisConnection(host, port, db)
+        self.prefix = prefix
+        # seconds after the last write that a day's keys expire, if set
+        self.expire_after = expire_after
+
+    def _key(self, day: str, key: str) -> str:
+        return self.prefix + ":" + day + ":" + key
+
+    def _index_commands(self, day: str, key: str) -> list:
+        commands = [
+            ("SADD", self.prefix + ":days", day),
+            ("SADD", self._key(day, "keys"), key),
+        ]
+
+        if self.expire_after:
+            commands.append(("EXPIRE", self._key(day, key), self.expire_after))
+            commands.append(("EXPIRE", self._key(day, "keys"), self.expire_after))
+
+        return commands
+
+    def _read_command(self, day: str, key: str):
+        if key in DICTIONARY_KEYS:
+            return ("HGETALL", self._key(day, key))
+
+        return ("SMEMBERS", self._key(day, key))
+
+    def _section(self, key: str, reply: list):
+        if key in DICTIONARY_KEYS:
+            return {
+                reply[i]: json.loads(reply[i + 1]) for i in range(0, len(reply), 2)
+            }
+
+        return reply
+
+    def list_days(self) -> list:
+        days = self.connection.pipeline([("SMEMBERS", self.prefix + ":days")])[0]
+
+        return sorted(days)
+
+    def load_day(self, day: str) -> dict:
+        keys = self.connection.pipeline([("SMEMBERS", self._key(day, "keys"))])[0]
+        replies = self.connection.pipeline([self._read_command(day, key) for key in keys])
+
+        return {
+            key: self._section(key, reply) for key, reply in zip(keys, replies) if reply
+        }
+
+    def get_fields(self, day: str, key: str, fields: list, timeout: float = None) -> dict:
+        fields = list(fields)
+
+        if not fields:
+            return {}
+
+        values = self.connection.pipeline([("HMGET", self._key(day, key), *fields)], timeout)[0]
+
+        return {
+            field: json.loads(value)
+            for field, value in zip(fields, values)
+            if value is not None
+        }
+
+    def get_many_fields(self, reads: list, timeout: float = None) -> list:
+        reads = [(day, key, list(fields)) for day, key, fields in reads]
+
+        replies = self.connection.pipeline(
+            [("HMGET", self._key(day, key), *fields) for day, key, fields in reads if fields],
+            timeout,
+        )
+        replies = iter(replies)
+
+        return [
+            {
+                field: json.loads(value)
+                for field, value in zip(fields, next(replies))
+                if value is not None
+            }
+            if fields
+            else {}
+            for _, _, fields in reads
+        ]
+
+    def get_values(self, pairs: list, timeout: float = None) -> list:
+        replies = self.connection.pipeline(
+            [self._read_command(day, key) for day, key in pairs], timeout
+        )
+
+        return [
+            self._section(key, reply) if reply else None
+            for (_, key), reply in zip(pairs, replies)
+        ]
+
+    def set_fields(self, day: str, key: str, mapping: dict):
+        if not mapping:
+            return
+
+        arguments = []
+
+        for field, value in mapping.items():
+            arguments.extend((field, json.dumps(value)))
+
+        self.connection.pipeline(
+            [("HSET", self._key(day, key), *arguments)] + self._index_commands(day, key)
+        )
+
+    def add_to_list(self, day: str, key: str, items: list):
+        if not items:
+            return
+
+        self.connection.pipeline(
+            [("SADD", self._key(day, key), *items)] + self._index_commands(day, key)
+        )
+
+    def increment_fields(self, day: str, key: str, counts: dict):
+        if not counts:
+            return
+
+        self.connection.pipeline(
+            [("HINCRBY", self._key(day, key), field, count) for field, count in counts.items()]
+            + self._index_commands(day, key)
+        )
+
+
+def backend_from_url(url: str) -> CacheBackend:
+    """
+    Create a cache backend from a URL.
+
+    `sqlite:///cache.db` (or `sqlite:////absolute/cache.db`) uses SQLite, `redis://host:port/db` uses a
+    Redis-compatible server and anything else is treated as a directory of JSON files.
+
+    Args:
+        url: The URL or directory of the cache.
+
+    Returns:
+        A cache backend.
+    """
+    parsed = urlparse(url)
+
+    if parsed.scheme == "sqlite":
+        return SQLiteBackend(parsed.path[1:])
+
+    if parsed.scheme == "redis":
+        return RedisBackend(
+            parsed.hostname or "localhost",
+            parsed.port or 6379,
+            int(parsed.path.lstrip("/") or 0),
+        )
+
+    return FilesystemBackend(url)
@@ -0,0 +1,386 @@
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+
+import disinfodomains.disinfodomains as engine
+from disinfodomains.disinfodomains import get_cache_days, get_day_cache
+
+CASCADE_MODEL_PATH = os.path.join(".disinfo-domains", "cascade.npz")
+# number of hashed n-gram features
+CASCADE_FEATURES = 2**18
+# share of each class of calibration categories that the first stage must not misclassify
+CASCADE_TARGET_AGREEMENT = 0.99
+# share of categories used to choose the uncertainty band
+CASCADE_CALIBRATION = 0.2
+# share of categories held out to measure agreement and throughput, unseen by training and calibration
+CASCADE_HELD_OUT = 0.2
+CASCADE_EPOCHS = 300
+CASCADE_LEARNING_RATE = 0.5
+CASCADE_L2 = 1e-6
+# categories labelled by the transformer in one forward pass during calibration
+CALIBRATION_BATCH_SIZE = 64
+
+active_classifier = None
+# the result of get_cascade_version for the file active_classifier was loaded from
+active_classifier_version = None
+
+
+def extract_features(text: str) -> list:
+    """
+    Hash the word, word bigram and character n-grams of a category.
+
+    Args:
+        text: The category.
+
+    Returns:
+        A list of feature indices.
+    """
+    text = text.lower()
+    words = re.findall(r"\w+", text)
+    padded = " " + " ".join(words) + " "
+
+    grams = ["w:" + word for word in words]
+    grams += ["b:" + first + " " + second for first, second in zip(words, words[1:])]
+    grams += [
+        "c:" + padded[i : i + n] for n in (3, 4) for i in range(len(padded) - n + 1)
+    ]
+
+    return [zlib.crc32(gram.encode("utf-8")) % CASCADE_FEATURES for gram in grams]
+
+
+def hash_features(texts: list):
+    """
+    Hash a batch of categories into a sparse feature matrix.
+
+    Args:
+        texts: The categories.
+
+    Returns:
+        A tuple of row indices, feature indices and values, one entry per non-zero cell.
+    """
+    features = [extract_features(text) for text in texts]
+    lengths = np.array([len(row) for row in features], dtype=np.int64)
+
+    rows = np.repeat(np.arange(len(texts)), lengths)
+    columns = np.fromiter(
+        (feature for row in features for feature in row), dtype=np.int64, count=lengths.sum()
+    )
+    # each row has unit L2 norm
+    values = np.repeat(1 / np.sqrt(np.maximum(lengths, 1)), lengths)
+
+    return rows, columns, values
+
+
+def sigmoid(scores: np.ndarray) -> np.ndarray:
+    return 1 / (1 + np.exp(-scores))
+
+
+class CascadeClassifier:
+    """
+    A hashed n-gram logistic regression distilled from the transformer sentiment classifier.
+
+    Categories scored between `low` and `high` are passed to the transformer.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: float, low: float = 0.0, high: float = 1.0):
+        self.weights = weights
+        self.bias = bias
+        self.low = low
+        self.high = high
+
+    def predict_proba(self, texts: list) -> np.ndarray:
+        """
+        Score a batch of categories.
+
+        Args:
+            texts: The categories to score.
+
+        Returns:
+            The probability that each category is negative.
+        """
+        rows, columns, values = hash_features(texts)
+
+        scores = self.bias + np.bincount(
+            rows, weights=self.weights[columns] * values, minlength=len(texts)
+        )
+
+        return sigmoid(scores)
+
+    def classify(self, texts: list) -> list:
+        """
+        Classify a batch of categories, sending only uncertain categories to the transformer.
+
+        Args:
+            texts: The categories to classify.
+
+        Returns:
+            The sentiment of each category, in order.
+        """
+        if not texts:
+            return []
+
+        probabilities = self.predict_proba(texts)
+
+        sentiments = np.where(probabilities >= self.high, "negative", "positive").astype(object)
+
+        uncertain = np.flatnonzero((probabilities > self.low) & (probabilities < self.high))
+
+        if len(uncertain) > 0:
+            sentiments[uncertain] = engine.get_sentiments([texts[i] for i in uncertain])
+
+        return sentiments.tolist()
+
+    def save(self, path: str = CASCADE_MODEL_PATH):
+        np.savez(path, weights=self.weights, bias=self.bias, low=self.low, high=self.high)
+
+    @classmethod
+    def load(cls, path: str = CASCADE_MODEL_PATH):
+        data = np.load(path)
+
+        return cls(
+            data["weights"], float(data["bias"]), float(data["low"]), float(data["high"])
+        )
+
+
+def train_linear_model(texts: list, labels: np.ndarray, epochs: int = CASCADE_EPOCHS):
+    """
+    Fit a logistic regression over hashed n-gram features with full-batch gradient descent.
+
+    Args:
+        texts: The categories.
+        labels: 1 for negative categories and 0 for positive categories.
+        epochs: The number of gradient steps.
+
+    Returns:
+        A tuple of the weights and the bias.
+    """
+    rows, columns, values = hash_features(texts)
+
+    weights = np.zeros(CASCADE_FEATURES)
+    bias = 0.0
+    # scale steps per feature by how often the feature occurs, so rare n-grams still learn
+    feature_counts = np.maximum(np.bincount(columns, minlength=CASCADE_FEATURES), 1)
+
+    for _ in range(epochs):
+        scores = bias + np.bincount(rows, weights=weights[columns] * values, minlength=len(texts))
+        errors = sigmoid(scores) - labels
+
+        gradient = np.bincount(columns, weights=errors[rows] * values, minlength=CASCADE_FEATURES)
+
+        weights -= CASCADE_LEARNING_RATE * (gradient / feature_counts + CASCADE_L2 * weights)
+        bias -= CASCADE_LEARNING_RATE * errors.mean()
+
+    return weights, bias
+
+
+def calibrate_band(
+    probabilities: np.ndarray,
+    labels: np.ndarray,
+    target_agreement: float = CASCADE_TARGET_AGREEMENT,
+):
+    """
+    Find the widest low and high thresholds that keep each class's misclassifications within budget.
+
+    At most `1 - target_agreement` of negative categories may be scored at or below `low`,
+    and at most `1 - target_agreement` of positive categories at or above `high`.
+
+    Args:
+        probabilities: The probability that each category is negative.
+        labels: 1 for negative categories and 0 for positive categories.
+        target_agreement: The share of each class that must agree with the labels.
+
+    Returns:
+        A tuple of the low and high thresholds.
+    """
+    order = np.argsort(probabilities)
+    sorted_probabilities = probabilities[order]
+    sorted_labels = labels[order]
+
+    # categories scored at or below low are classified as positive
+    missed_negatives = np.cumsum(sorted_labels)
+    valid = np.flatnonzero(missed_negatives <= (1 - target_agreement) * sorted_labels.sum())
+    low = sorted_probabilities[valid.max()] if len(valid) else 0.0
+
+    # categories scored at or above high are classified as negative
+    misflagged_positives = np.cumsum((1 - sorted_labels)[::-1])[::-1]
+    valid = np.flatnonzero(misflagged_positives <= (1 - target_agreement) * (1 - sorted_labels).sum())
+    high = sorted_probabilities[valid.min()] if len(valid) else 1.0
+
+    return float(low), float(max(high, np.nextafter(low, 1)))
+
+
+def get_cached_categories() -> list:
+    """
+    Retrieve every category saved in the day caches.
+
+    Returns:
+        A deduplicated list of categories.
+    """
+    categories = {}
+
+    for day_name in get_cache_days():
+        day = get_day_cache(day_name)
+
+        # sentiments are saved as "<sentiment fingerprint>:<category>"
+        categories.update(
+            dict.fromkeys(
+                re.sub(r"^[0-9a-f]{16}:", "", key) for key in day.get("sentiments", {})
+            )
+        )
+
+        for domain_categories in day.get("categories", {}).values():
+            categories.update(dict.fromkeys(domain_categories or []))
+
+    return list(categories)
+
+
+def calibrate(
+    categories: list = None,
+    target_agreement: float = CASCADE_TARGET_AGREEMENT,
+    path: str = CASCADE_MODEL_PATH,
+):
+    """
+    Train the cascade classifier on transformer labels and report its agreement and throughput.
+
+    Categories are split three ways: the classifier is trained on one share, its uncertainty
+    band is chosen on `CASCADE_CALIBRATION` and its agreement and throughput are measured
+    on `CASCADE_HELD_OUT`, so the reported figures are out of sample.
+
+    Args:
+        categories: The categories to train on. Defaults to every cached category.
+        target_agreement: The share of each class of calibration categories that the first stage must not misclassify.
+        path: The file to save the classifier to.
+
+    Returns:
+        A tuple of the classifier and a report on its agreement with the transformer and throughput.
+    """
+    global active_classifier
+    global active_classifier_version
+
+    if categories is None:
+        categories = get_cached_categories()
+
+    categories = list(dict.fromkeys(categories))
+
+    if len(categories) < 10:
+        raise ValueError("At least 10 categories are needed to calibrate the cascade classifier.")
+
+    # loaded before timing, so transformer throughput does not include importing torch
+    engine.load_sentiment_model()
+
+    start = time.perf_counter()
+    sentiments = []
+
+    for i in range(0, len(categories), CALIBRATION_BATCH_SIZE):
+        sentiments.extend(engine.get_sentiments(categories[i : i + CALIBRATION_BATCH_SIZE]))
+
+    transformer_seconds = time.perf_counter() - start
+
+    labels = np.array([sentiment == "negative" for sentiment in sentiments], dtype=float)
+
+    order = np.random.default_rng(0).permutation(len(categories))
+    held_out_count = max(1, int(len(categories) * CASCADE_HELD_OUT))
+    calibration_count = max(1, int(len(categories) * CASCADE_CALIBRATION))
+
+    held_out = order[:held_out_count]
+    calibration = order[held_out_count : held_out_count + calibration_count]
+    train = order[held_out_count + calibration_count :]
+
+    weights, bias = train_linear_model([categories[i] for i in train], labels[train])
+    classifier = CascadeClassifier(weights, bias)
+
+    classifier.low, classifier.high = calibrate_band(
+        classifier.predict_proba([categories[i] for i in calibration]),
+        labels[calibration],
+        target_agreement,
+    )
+    classifier.save(path)
+
+    # the next classification loads the new band, and the sentiment fingerprint changes with the file
+    active_classifier = None
+    active_classifier_version = None
+
+    held_out_categories = [categories[i] for i in held_out]
+    held_out_labels = labels[held_out]
+
+    start = time.perf_counter()
+    probabilities = classifier.predict_proba(held_out_categories)
+    stage_one_seconds = time.perf_counter() - start
+
+    # a real pass through both stages, so deferred categories are timed on the transformer
+    start = time.perf_counter()
+    cascade_sentiments = classifier.classify(held_out_categories)
+    cascade_seconds = time.perf_counter() - start
+
+    confident = (probabilities <= classifier.low) | (probabilities >= classifier.high)
+    stage_one_labels = (probabilities >= classifier.high).astype(float)
+    agrees = stage_one_labels == held_out_labels
+    cascade_labels = np.array(
+        [sentiment == "negative" for sentiment in cascade_sentiments], dtype=float
+    )
+
+    report = {
+        "categories": len(categories),
+        "negative_categories": int(labels.sum()),
+        "calibration": len(calibration),
+        "held_out": len(held_out),
+        "low": classifier.low,
+        "high": classifier.high,
+        "deferred_to_transformer": float(1 - confident.mean()),
+        "cascade_agreement": float((cascade_labels == held_out_labels).mean()),
+        "stage_one_agreement": float(agrees[confident].mean()) if confident.any() else None,
+        "stage_one_categories_per_second": len(held_out) / max(stage_one_seconds, 1e-9),
+        "transformer_categories_per_second": len(categories) / max(transformer_seconds, 1e-9),
+        "cascade_categories_per_second": len(held_out) / max(cascade_seconds, 1e-9),
+    }
+
+    return classifier, report
+
+
+def get_cascade_version():
+    """
+    Identify the saved cascade classifier by the modification time and size of its file.
+
+    Used in `get_sentiment_fingerprint`, so sentiments classified before a recalibration
+    are not reused.
+
+    Returns:
+        A string, or None if no classifier has been calibrated.
+    """
+    try:
+        stat = os.stat(CASCADE_MODEL_PATH)
+    except FileNotFoundError:
+        return None
+
+    return "%d:%d" % (stat.st_mtime_ns, stat.st_size)
+
+
+def classify_categories(categories: list) -> dict:
+    """
+    Classify categories with the saved cascade classifier.
+
+    The classifier is loaded again whenever its file changes. If no classifier has been
+    calibrated, every category is sent to the transformer.
+
+    Args:
+        categories: The categories to classify.
+
+    Returns:
+        A dictionary of categories to sentiments.
+    """
+    global active_classifier
+    global active_classifier_version
+
+    version = get_cascade_version()
+
+    if version != active_classifier_version:
+        active_classifier = CascadeClassifier.load(CASCADE_MODEL_PATH) if version else None
+        active_classifier_version = version
+
+    if active_classifier is None:
+        return dict(zip(categories, engine.get_sentiments(categories)))
+
+    return dict(zip(categories, active_classifier.classify(categories)))
@@ -0,0 +1,358 @@
+import argparse
+import csv
+
+
+def read_domains(path: str) -> list:
+    """
+    Read a list of domains from a file, one per line.
+
+    Args:
+        path: The path to the file.
+
+    Returns:
+        A list of domains, in file order.
+    """
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be at least 1, not " + value)
+
+    return number
+
+
+def resolve(value, default):
+    # options default to None so their defaults are only imported by the command that uses them
+    return default if value is None else value
+
+
+def build_filter(args):
+    from disinfodomains.known_filter import (
+        FILTER_FALSE_POSITIVE_RATE,
+        FILTER_PATH,
+        FILTER_SIZE_BUDGET,
+        write_known_domains_filter,
+    )
+
+    check_domains = read_domains(args.check_domains) if args.check_domains else None
+
+    try:
+        report = write_known_domains_filter(
+            resolve(args.output, FILTER_PATH),
+            check_domains,
+            resolve(args.false_positive_rate, FILTER_FALSE_POSITIVE_RATE),
+            resolve(args.size_budget, FILTER_SIZE_BUDGET),
+        )
+    except FileNotFoundError as e:
+        raise SystemExit(str(e))
+
+    for key, value in report.items():
+        print(key + ": " + str(value))
+
+
+def warm(args):
+    from disinfodomains.warm import WARM_CONCURRENCY, WARM_HITS_DAYS, warm_cache
+
+    summary = warm_cache(
+        read_domains(args.domains),
+        args.budget,
+        resolve(args.concurrency, WARM_CONCURRENCY),
+        resolve(args.hits_days, WARM_HITS_DAYS),
+    )
+
+    for key, value in summary.items():
+        print(key + ": " + str(value))
+
+
+def calibrate(args):
+    from disinfodomains.cascade import (
+        CASCADE_MODEL_PATH,
+        CASCADE_TARGET_AGREEMENT,
+        calibrate,
+    )
+
+    categories = read_domains(args.categories) if args.categories else None
+
+    _, report = calibrate(
+        categories,
+        resolve(args.target_agreement, CASCADE_TARGET_AGREEMENT),
+        resolve(args.output, CASCADE_MODEL_PATH),
+    )
+
+    for key, value in report.items():
+        print(key + ": " + str(value))
+
+
+def report(args):
+    from disinfodomains.disinfodomains import (
+        generate_report_progressive,
+        is_flagged_by_cheap_checks,
+    )
+
+    for partial in generate_report_progressive(args.domain, not args.no_consensus):
+        print("%-18s %8.1f ms" % (partial["stage"], partial["elapsed"] * 1000))
+
+        if args.fast and is_flagged_by_cheap_checks(partial["report"]):
+            break
+
+    for key, value in partial["report"].items():
+        print(key + ": " + ", ".join(value))
+
+
+def traffic(args):
+    from disinfodomains.traffic import flagged_traffic_report
+
+    flagged_domains, summary = flagged_traffic_report(
+        args.logs,
+        args.format,
+        args.column,
+        args.top_k,
+        not args.no_consensus,
+        not args.no_fetch,
+    )
+
+    for key, value in summary.items():
+        print(key + ": " + str(value))
+
+    for domain in flagged_domains:
+        reasons = domain["flagged_categories"] + domain["negative_sentiment_categories"]
+
+        if domain["known_problematic_website"]:
+            reasons = ["known problematic website"] + reasons
+
+        print(
+            "%10d %6.2f%% %s (%s)"
+            % (domain["hits"], domain["share"] * 100, domain["domain"], ", ".join(reasons))
+        )
+
+    if args.output:
+        with open(args.output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                [
+                    "domain",
+                    "hits",
+                    "share",
+                    "known_problematic_website",
+                    "flagged_categories",
+                    "negative_sentiment_categories",
+                ]
+            )
+
+            for domain in flagged_domains:
+                writer.writerow(
+                    [
+                        domain["domain"],
+                        domain["hits"],
+                        domain["share"],
+                        domain["known_problematic_website"],
+                        "; ".join(domain["flagged_categories"]),
+                        "; ".join(domain["negative_sentiment_categories"]),
+                    ]
+                )
+
+
+def profile(args):
+    import json
+
+    from disinfodomains.profiling import (
+        PROFILE_FIXTURES_PATH,
+        PROFILE_OUTPUT_DIRECTORY,
+        PROFILE_REGRESSION_THRESHOLD,
+        compare_to_baseline,
+        profile_corpus,
+    )
+
+    output = resolve(args.output, PROFILE_OUTPUT_DIRECTORY)
+
+    summary = profile_corpus(
+        read_domains(args.domains),
+        output,
+        resolve(args.fixtures, PROFILE_FIXTURES_PATH),
+        args.record,
+        not args.no_consensus,
+        not args.no_memory,
+    )
+
+    print("%-18s %12s %14s" % ("stage", "ms/domain", "peak KiB"))
+
+    for stage, stats in summary["stages"].items():
+        # peak memory is None when it was not measured
+        peak = "n/a" if stats["peak_bytes"] is None else "%.1f" % (stats["peak_bytes"] / 1024)
+
+        print("%-18s %12.2f %14s" % (stage, stats["seconds_per_domain"] * 1000, peak))
+
+    for component, seconds in summary["components"].items():
+        print(component + ": %.3f s" % seconds)
+
+    print("Results written to", output)
+
+    if not args.baseline:
+        return
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(summary, f, indent=2)
+
+        print("Baseline written to", args.baseline)
+        return
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+
+    regressions = compare_to_baseline(
+        summary, baseline, resolve(args.threshold, PROFILE_REGRESSION_THRESHOLD)
+    )
+
+    for regression in regressions:
+        print("Regression in " + regression)
+
+    if regressions:
+        raise SystemExit(1)
+
+
+def main(argv=None):
+    # traffic only imports numpy; other modules load the report engine, so their defaults are resolved by their command
+    from disinfodomains.traffic import TRAFFIC_LOG_FORMATS, TRAFFIC_TOP_K
+
+    parser = argparse.ArgumentParser(prog="disinfodomains")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_filter_parser = subparsers.add_parser(
+        "build-filter",
+        help="Compile the known problematic websites lists into a filter for the browser extension.",
+    )
+    build_filter_parser.add_argument(
+        "--output",
+        help="Defaults to webext/known_domains.json, relative to the working directory.",
+    )
+    build_filter_parser.add_argument(
+        "--check-domains",
+        help="File of unlisted domains, one per line, used to measure false positives. Defaults to every cached domain.",
+    )
+    build_filter_parser.add_argument("--false-positive-rate", type=float)
+    build_filter_parser.add_argument(
+        "--size-budget",
+        type=int,
+        help="Maximum size of the filter bit array, in bytes.",
+    )
+    build_filter_parser.set_defaults(func=build_filter)
+
+    warm_parser = subparsers.add_parser(
+        "warm",
+        help="Precompute today's cache for a ranked list of domains.",
+    )
+    warm_parser.add_argument("domains", help="File of ranked domains, one per line.")
+    warm_parser.add_argument(
+        "--budget",
+        type=int,
+        help="Maximum number of domains to fetch from Wikipedia.",
+    )
+    warm_parser.add_argument("--concurrency", type=int)
+    warm_parser.add_argument(
+        "--hits-days",
+        type=int,
+        help="Number of days of hit counts used to prioritize domains.",
+    )
+    warm_parser.set_defaults(func=warm)
+
+    calibrate_parser = subparsers.add_parser(
+        "calibrate",
+        help="Train the cascade sentiment classifier on transformer labels.",
+    )
+    calibrate_parser.add_argument(
+        "--categories",
+        help="File of categories, one per line. Defaults to every cached category.",
+    )
+    calibrate_parser.add_argument(
+        "--target-agreement",
+        type=float,
+        help="Share of each class the first stage must classify the same way as the transformer.",
+    )
+    calibrate_parser.add_argument("--output")
+    calibrate_parser.set_defaults(func=calibrate)
+
+    report_parser = subparsers.add_parser(
+        "report",
+        help="Generate a report for a domain, printing the latency of each stage.",
+    )
+    report_parser.add_argument("domain")
+    report_parser.add_argument(
+        "--fast",
+        action="store_true",
+        help="Stop as soon as the domain is on a known list or in a flagged category.",
+    )
+    report_parser.add_argument("--no-consensus", action="store_true")
+    report_parser.set_defaults(func=report)
+
+    traffic_parser = subparsers.add_parser(
+        "traffic",
+        help="Rank the flagged domains requested in proxy, DNS or CSV access logs.",
+    )
+    traffic_parser.add_argument(
+        "logs", nargs="+", help="Access logs, optionally gzipped, or - for standard input."
+    )
+    traffic_parser.add_argument("--format", choices=TRAFFIC_LOG_FORMATS, default="auto")
+    traffic_parser.add_argument(
+        "--column",
+        help="For CSV logs, the name or index of the column containing hosts or URLs.",
+    )
+    traffic_parser.add_argument(
+        "--top-k",
+        type=positive_int,
+        default=TRAFFIC_TOP_K,
+        help="Number of most requested domains to check against Wikipedia categories. Every domain is checked against the known lists.",
+    )
+    traffic_parser.add_argument("--no-consensus", action="store_true")
+    traffic_parser.add_argument(
+        "--no-fetch",
+        action="store_true",
+        help="Only use today's cache and the known lists.",
+    )
+    traffic_parser.add_argument("--output", help="Write the flagged domains to a CSV file.")
+    traffic_parser.set_defaults(func=traffic)
+
+    profile_parser = subparsers.add_parser(
+        "profile",
+        help="Profile report generation for a corpus of domains against recorded HTTP responses.",
+    )
+    profile_parser.add_argument("domains", help="File of domains, one per line.")
+    profile_parser.add_argument("--fixtures")
+    profile_parser.add_argument(
+        "--record",
+        action="store_true",
+        help="Make requests over the network and save them as fixtures.",
+    )
+    profile_parser.add_argument("--output")
+    profile_parser.add_argument("--no-consensus", action="store_true")
+    profile_parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="Do not measure memory, which makes stage times more accurate.",
+    )
+    profile_parser.add_argument(
+        "--baseline",
+        help="Summary of an earlier run. The command fails if any stage is slower than in the baseline.",
+    )
+    profile_parser.add_argument(
+        "--threshold",
+        type=float,
+        help="Share of the baseline time per domain a stage may grow by.",
+    )
+    profile_parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Write this run's summary to --baseline instead of comparing against it.",
+    )
+    profile_parser.set_defaults(func=profile)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,58 @@
+import asyncio
 import datetime
+import hashlib
+import io
 import json
-import os
 import re
+import threading
+import time
 import warnings
 
 # suppress UserWarning from Transformers
 warnings.filterwarnings("ignore")
 
+import atexit
 import csv
-from urllib.parse import urlparse
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from urllib.parse import quote, urlparse
 
 import pandas as pd
 import requests
-import torch
 import validators
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
 
-tokenizer = AutoTokenizer.from_pretrained("stevhliu/my_awesome_model")
-model = AutoModelForSequenceClassification.from_pretrained("stevhliu/my_awesome_model")
+from disinfodomains.backends import CacheBackend, FilesystemBackend, backend_from_url
+
+SENTIMENT_MODEL = "stevhliu/my_awesome_model"
+
+# loaded by load_sentiment_model the first time a category is classified
+tokenizer = None
+model = None
 
 SENTIMENT_CLASSIFIER_CONFIDENCE = 0.8
+# classify categories with disinfodomains.cascade before falling back to the transformer
+SENTIMENT_CASCADE = False
 CONSENSUS_STRATEGY = "in_one_or_more"
 USER_AGENT = "Mozilla/5.0; disinfo-domains/0.1"
+# report keys that are enough to flag a domain when generating a fast verdict
+FAST_VERDICT_KEYS = ("known_problematic_websites", "flagged_categories")
+# stages of generate_report_progressive, in order
+REPORT_STAGES = ("known_lists", "cached_categories", "rules", "fetch", "sentiment", "consensus")
+# seconds to wait for a Wikipedia response when there is no deadline
+REQUEST_TIMEOUT = 10
+# categories classified per forward pass; deadlines are checked between batches
+SENTIMENT_BATCH_SIZE = 32
+# threads that finish reports in the background after their deadline passes
+BACKGROUND_WORKERS = 2
+# days to look back for revision IDs when revalidating a domain's categories
+REVALIDATION_DAYS = 7
+# the most titles the MediaWiki API accepts in one query
+REVALIDATION_BATCH_SIZE = 50
+# redirect hops followed before a page is treated as missing
+MAX_REDIRECTS = 5
+# name the redirect map is stored under in the cache backend; it is kept across days
+REDIRECTS_CACHE = "redirects"
 
 CATEGORIES_TO_FLAG = {
     "Satire": [
@@ -44,16 +75,300 @@ KNOWN_CSV_LISTS = {}
 
 CACHE_DIRECTORY = ".disinfo-domains/cache"  # os.path.join("~", ".disinfo-domains", "cache")
 
-os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+# day cache keys that hold lookups rather than a domain's negative sentiment categories
+CACHE_METADATA_KEYS = (
+    "known_problematic_websites",
+    "last_modified",
+    "known_lists",
+    "categories",
+    "sentiments",
+    "hits",
+    "reports",
+    "revisions",
+    "redirects",
+)
+
+# hits are written to the cache backend after this many unsaved hits, and on exit
+HITS_SAVE_INTERVAL = 100
+
+# seconds a complete report is reused for; 0 disables the report cache
+REPORT_CACHE_TTL = 3600
+# reports kept in memory, least recently used first
+REPORT_CACHE_SIZE = 10000
 
 global active_cache
 global active_cache_day
 
 active_cache_day = None
 active_cache = {}
+unsaved_hits = {}
+# titles to the canonical titles they redirect to, or None if they were found not to redirect
+redirect_map = {}
+
+cache_lock = threading.RLock()
+model_lock = threading.Lock()
+
+cache_backend = FilesystemBackend(CACHE_DIRECTORY)
+
+background_executor = None
+background_domains = set()
+
+report_cache = OrderedDict()
+
+# futures of lookups in progress, so concurrent callers share one lookup
+in_flight = {}
+in_flight_lock = threading.Lock()
+async_in_flight = {}
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a report's deadline passes before a stage can finish.
+    """
+
+
+def time_remaining(expires_at: float = None, limit: float = None):
+    """
+    Get the seconds left before a deadline.
+
+    Args:
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+        limit: The maximum number of seconds to return.
+
+    Returns:
+        The seconds left, capped at `limit`, or `limit` if there is no deadline.
+
+    Raises:
+        DeadlineExceeded: If the deadline has passed.
+    """
+    if expires_at is None:
+        return limit
+
+    remaining = expires_at - time.monotonic()
+
+    if remaining <= 0:
+        raise DeadlineExceeded()
+
+    return remaining if limit is None else min(remaining, limit)
+
+
+def get_with_deadline(url: str, headers: dict, expires_at: float = None):
+    """
+    Make a GET request that times out at a deadline, or after `REQUEST_TIMEOUT` seconds.
+
+    Args:
+        url: The URL to request.
+        headers: The request headers.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+
+    Returns:
+        The response.
+
+    Raises:
+        DeadlineExceeded: If the deadline passes before the response arrives.
+    """
+    timeout = time_remaining(expires_at, REQUEST_TIMEOUT)
+
+    try:
+        return requests.get(url, headers=headers, timeout=timeout)
+    except requests.exceptions.Timeout:
+        if timeout < REQUEST_TIMEOUT:
+            raise DeadlineExceeded()
+
+        raise
+
+
+def get_backend_fields(day: str, key: str, fields: list, expires_at: float = None) -> dict:
+    """
+    Read several fields from the cache backend, giving up at a deadline.
+
+    A shared backend, such as Redis, is read over the network, so a slow reply must not
+    hold a report past its deadline.
+
+    Args:
+        day: The day to read.
+        key: The dictionary to read, such as "categories".
+        fields: The fields to read.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+
+    Returns:
+        A dictionary of the fields that were found.
+
+    Raises:
+        DeadlineExceeded: If the deadline passes before the backend replies.
+    """
+    timeout = time_remaining(expires_at)
+
+    try:
+        return cache_backend.get_fields(day, key, fields, timeout)
+    except OSError:
+        if expires_at is not None and time.monotonic() >= expires_at:
+            raise DeadlineExceeded()
+
+        raise
+
+
+def get_many_backend_fields(reads: list, expires_at: float = None) -> list:
+    """
+    Read fields of several dictionaries from the cache backend in one request, giving up at a deadline.
+
+    Args:
+        reads: (day, key, fields) tuples.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+
+    Returns:
+        A dictionary of the fields found for each read, in order.
+
+    Raises:
+        DeadlineExceeded: If the deadline passes before the backend replies.
+    """
+    timeout = time_remaining(expires_at)
+
+    try:
+        return cache_backend.get_many_fields(reads, timeout)
+    except OSError:
+        if expires_at is not None and time.monotonic() >= expires_at:
+            raise DeadlineExceeded()
+
+        raise
+
+
+def get_backend_values(pairs: list, expires_at: float = None) -> list:
+    """
+    Read the value of several (day, key) pairs from the cache backend, giving up at a deadline.
+
+    Args:
+        pairs: The (day, key) pairs to read.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+
+    Returns:
+        The value of each pair, or None if it is missing.
 
+    Raises:
+        DeadlineExceeded: If the deadline passes before the backend replies.
+    """
+    timeout = time_remaining(expires_at)
+
+    try:
+        return cache_backend.get_values(pairs, timeout)
+    except OSError:
+        if expires_at is not None and time.monotonic() >= expires_at:
+            raise DeadlineExceeded()
+
+        raise
+
+
+def single_flight(key, function, expires_at: float = None):
+    """
+    Run a function once for every concurrent caller with the same key.
+
+    The first caller runs the function. Callers that arrive while it is running wait
+    for, and share, its result or exception.
+
+    Args:
+        key: Identifies the lookup, such as `("categories", domain)`.
+        function: A function that takes no arguments.
+        expires_at: A `time.monotonic()` value after which to stop waiting, or None for no deadline.
+
+    Returns:
+        The result of the function.
+
+    Raises:
+        DeadlineExceeded: If the deadline passes while waiting for another caller.
+    """
+    while True:
+        with in_flight_lock:
+            future = in_flight.get(key)
+            is_first_caller = future is None
+
+            if is_first_caller:
+                future = in_flight[key] = Future()
+
+        if is_first_caller:
+            break
+
+        timeout = time_remaining(expires_at)
+
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            raise DeadlineExceeded()
+        except DeadlineExceeded:
+            # the first caller ran out of time, but this caller may not have
+            continue
+
+    try:
+        result = function()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with in_flight_lock:
+            del in_flight[key]
+
+
+def set_cache_backend(backend):
+    """
+    Set where day caches are stored.
+
+    Use a shared backend, such as `disinfodomains.backends.RedisBackend`, so every node
+    in a deployment reuses the same fetches, sentiments and consensus history.
+
+    Args:
+        backend: A `disinfodomains.backends.CacheBackend`, or a URL accepted by
+            `disinfodomains.backends.backend_from_url`.
+
+    Returns:
+        None
+    """
+    global cache_backend
+    global active_cache
+    global active_cache_day
+    global redirect_map
+
+    if not isinstance(backend, CacheBackend):
+        backend = backend_from_url(backend)
 
-def get_day_cache(day=datetime.datetime.now().strftime("%Y-%m-%d")):
+    with cache_lock:
+        save_hits()
+
+        cache_backend = backend
+        active_cache = {}
+        active_cache_day = None
+        redirect_map = {}
+
+
+def today() -> str:
+    """
+    Get today's date in the format used to name day caches.
+
+    Returns:
+        Today's date.
+    """
+    return datetime.datetime.now().strftime("%Y-%m-%d")
+
+
+def get_recent_days(n: int) -> list:
+    """
+    List today and the days before it, newest first, in the format used to name day caches.
+
+    Args:
+        n: The number of days, including today.
+
+    Returns:
+        A list of days.
+    """
+    start = datetime.datetime.strptime(today(), "%Y-%m-%d")
+
+    return [
+        (start - datetime.timedelta(days=num)).strftime("%Y-%m-%d") for num in range(n)
+    ]
+
+
+def get_day_cache(day: str = None):
     """
     Retrieve the cache for a specific day.
 
@@ -69,36 +384,38 @@ def get_day_cache(day=datetime.datetime.now().strftime("%Y-%m-%d")):
     Returns:
         The cache for the specified day.
     """
+    day = day or today()
+
     print("Reading cache for", day)
 
     global active_cache
     global active_cache_day
 
     # check active cache for today
-    if active_cache_day == datetime.datetime.now().strftime(
-        "%Y-%m-%d"
-    ) and day == datetime.datetime.now().strftime("%Y-%m-%d"):
+    if active_cache_day == today() and day == today():
         return active_cache
 
-    print("Reading cache for", day, "from file")
+    print("Reading cache for", day, "from", type(cache_backend).__name__)
 
-    cache_file = os.path.join(CACHE_DIRECTORY, day + ".json")
-    active_cache_day = datetime.datetime.now().strftime("%Y-%m-%d")
+    cache = cache_backend.load_day(day)
 
-    if os.path.exists(cache_file):
-        with open(cache_file, "r") as f:
-            return json.load(f)
+    if day == today():
+        active_cache = cache
+        active_cache_day = day
 
-    return {}
+    return cache
 
 
-def save_to_cache(cache, data, key, day=datetime.datetime.now().strftime("%Y-%m-%d")):
+def save_to_cache(cache, data, key, day: str = None):
     """
     Save a value to the cache.
 
     This function will set a value in the cache if the value does not exist, or merge the value with the existing value.
 
-    Merging is supported specifically because this package only deals with flat lists of items.
+    Lists are merged as sets and dictionaries are merged key by key, with `data` taking precedence.
+
+    Only `data` is written to the cache backend, so writes from other processes and nodes are kept.
+    The backend is written to outside `cache_lock`, so threads filling the cache do not wait on each other's writes.
 
     Args:
         cache: The cache to save the value to.
@@ -109,21 +426,137 @@ def save_to_cache(cache, data, key, day=datetime.datetime.now().strftime("%Y-%m-
     Returns:
         None
     """
-    cache_file = os.path.join(CACHE_DIRECTORY, day + ".json")
+    day = day or today()
 
-    if key not in cache:
-        cache[key] = data
-    else:
-        cache[key] = list(set(cache[key] + data))
+    merge_into_cache(cache, data, key, day)
+    write_to_cache_backend(data, key, day)
 
-    with open(cache_file, "w") as f:
-        json.dump(cache, f)
 
+def merge_into_cache(cache, data, key, day: str):
     global active_cache
     global active_cache_day
 
-    active_cache = cache
-    active_cache_day = day
+    with cache_lock:
+        if key not in cache:
+            cache[key] = data
+        elif isinstance(data, dict):
+            cache[key] = {**cache[key], **data}
+        else:
+            cache[key] = list(set(cache[key] + data))
+
+        active_cache = cache
+        active_cache_day = day
+
+
+def write_to_cache_backend(data, key, day: str):
+    if isinstance(data, dict):
+        cache_backend.set_fields(day, key, data)
+    else:
+        cache_backend.add_to_list(day, key, data)
+
+
+def get_cache_days() -> list:
+    """
+    List every day with a cache in the cache backend.
+
+    Returns:
+        A list of days, oldest first.
+    """
+    return [day for day in cache_backend.list_days() if day != REDIRECTS_CACHE]
+
+
+def get_cached_fields(cache, key: str, fields: list, expires_at: float = None) -> dict:
+    """
+    Look up several fields of a dictionary in today's cache.
+
+    Fields that are not in the local copy of the cache are requested from the cache
+    backend in one batch, so values saved by other processes or nodes are reused.
+
+    Args:
+        cache: Today's cache.
+        key: The dictionary to look up, such as "categories".
+        fields: The fields to look up.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+
+    Returns:
+        A dictionary of the fields that were found.
+    """
+    with cache_lock:
+        section = cache.setdefault(key, {})
+        missing = [field for field in dict.fromkeys(fields) if field not in section]
+
+    if missing:
+        found = get_backend_fields(today(), key, missing, expires_at)
+
+        with cache_lock:
+            section.update(found)
+
+    return {field: section[field] for field in fields if field in section}
+
+
+def record_hit(cache, domain: str):
+    """
+    Count a lookup of a domain in today's cache.
+
+    Hit counts are used by `disinfodomains.warm.warm_cache` to decide which domains to warm first.
+
+    Args:
+        cache: Today's cache.
+        domain: The domain that was looked up.
+
+    Returns:
+        None
+    """
+    with cache_lock:
+        hits = cache.setdefault("hits", {})
+        hits[domain] = hits.get(domain, 0) + 1
+        unsaved_hits[domain] = unsaved_hits.get(domain, 0) + 1
+        is_due = sum(unsaved_hits.values()) >= HITS_SAVE_INTERVAL
+
+    if is_due:
+        save_hits()
+
+
+@atexit.register
+def save_hits():
+    """
+    Add hits counted since the last save to today's cache backend.
+
+    Returns:
+        None
+    """
+    global unsaved_hits
+
+    with cache_lock:
+        hits = unsaved_hits
+        day = active_cache_day or today()
+        unsaved_hits = {}
+
+    if hits:
+        cache_backend.increment_fields(day, "hits", hits)
+
+
+def get_hit_counts(n: int = 7) -> dict:
+    """
+    Count lookups of each domain over the last n days.
+
+    Args:
+        n: The number of days to count.
+
+    Returns:
+        A dictionary of domains to hit counts.
+    """
+    save_hits()
+
+    days = get_recent_days(n)
+
+    hit_counts = {}
+
+    for hits in cache_backend.get_values([(day, "hits") for day in days]):
+        for domain, count in (hits or {}).items():
+            hit_counts[domain] = hit_counts.get(domain, 0) + count
+
+    return hit_counts
 
 
 def get_consensus(
@@ -131,6 +564,7 @@ def get_consensus(
     n: int = 3,
     consensus_strategy: str = "in_one_or_more",
     consensus: float = 0.75,
+    expires_at: float = None,
 ):
     """
     Check for a consensus of categories.
@@ -149,23 +583,21 @@ def get_consensus(
         n: The number of days to check.
         consensus_strategy: The strategy to use.
         consensus: The consensus threshold.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
 
     Returns:
         A list of problematic categories.
     """
-    days = [datetime.datetime.now().strftime("%Y-%m-%d")]
-
     if n == 1:
         return get_day_cache()[domain]
 
-    for num in range(1, n):
-        days.append(
-            (datetime.datetime.now() - datetime.timedelta(days=num)).strftime(
-                "%Y-%m-%d"
-            )
-        )
+    days = get_recent_days(n)
 
-    categories = [get_day_cache(day).get(domain, []) for day in days]
+    # one batched request for every day
+    categories = [
+        day_categories or []
+        for day_categories in get_backend_values([(day, domain) for day in days], expires_at)
+    ]
 
     category_count = {}
 
@@ -215,13 +647,42 @@ def extract_categories(content: str) -> list:
     return categories
 
 
-def extract_known_problematic_websites(cache: str, url: str) -> list:
+def get_previous_known_list(url: str, expires_at: float = None):
+    """
+    Find the most recent copy of a known list saved before today.
+
+    Only the last `REVALIDATION_DAYS` days are searched, in one request to the cache backend.
+
+    Args:
+        url: The URL of the Wikipedia page.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+
+    Returns:
+        A tuple of the list and its Last-Modified header, or (None, None) if there is no copy.
+    """
+    days = get_recent_days(REVALIDATION_DAYS + 1)[1:]
+    reads = [(day, key, [url]) for day in days for key in ("known_lists", "last_modified")]
+    sections = get_many_backend_fields(reads, expires_at)
+
+    # newest first
+    for known_lists, last_modified in zip(sections[::2], sections[1::2]):
+        if url in known_lists:
+            return known_lists[url], last_modified.get(url)
+
+    return None, None
+
+
+def extract_known_problematic_websites(cache: str, url: str, expires_at: float = None) -> list:
     """
     Extract known problematic websites from a specified Wikipedia page.
 
+    Concurrent callers for the same page share one request. If the list was saved on a
+    previous day, it is requested with If-Modified-Since and reused if it has not changed.
+
     Args:
         cache: The cache to use.
         url: The URL of the Wikipedia page.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
 
     Returns:
         A list of known problematic websites.
@@ -229,10 +690,19 @@ def extract_known_problematic_websites(cache: str, url: str) -> list:
 
     heading = KNOWN_LISTS[url]
 
-    if url in cache:
-        result = cache["known_problematic_websites"]
-    else:
-        last_modified = cache.get("last_modified", {}).get(url, None)
+    known_list = get_cached_fields(cache, "known_lists", [url], expires_at)
+
+    if url in known_list:
+        return known_list[url]
+
+    def fetch():
+        # another caller may have refreshed the list since it was checked
+        known_list = get_cached_fields(cache, "known_lists", [url], expires_at)
+
+        if url in known_list:
+            return known_list[url]
+
+        previous_list, last_modified = get_previous_known_list(url, expires_at)
 
         headers = {"User-Agent": USER_AGENT}
 
@@ -240,33 +710,60 @@ def extract_known_problematic_websites(cache: str, url: str) -> list:
             headers["If-Modified-Since"] = last_modified
 
         try:
-            response = requests.get(
-                url,
-                headers=headers,
-                timeout=10,
-            )
+            response = get_with_deadline(url, headers, expires_at)
         except requests.exceptions.RequestException as e:
             print("Error fetching", url, e)
             return []
 
-        if not cache.get("last_modified"):
-            cache["last_modified"] = {}
+        if response.status_code == 304:
+            # unchanged since the previous day's copy, which is carried over to today
+            save_to_cache(cache, {url: previous_list}, "known_lists")
+            save_to_cache(cache, {url: last_modified}, "last_modified")
 
-        cache["last_modified"][url] = response.headers.get("Last-Modified", None)
+            return previous_list
 
-        if response.status_code == 304:
-            result = cache.get("known_problematic_websites", [])
-            save_to_cache(cache, result, "known_problematic_websites")
-            return result
+        if response.status_code != 200:
+            print("Error fetching", url, response.status_code)
+            return []
 
-        tables = pd.read_html(response.text)
+        # newer versions of pandas read a string as a path, so the page is passed as a file
+        tables = pd.read_html(io.StringIO(response.text))
         flat_table = pd.concat(tables)
         result = flat_table[heading].tolist()
         # remove [.com] and nan
         result = [x.replace("[.]", ".").lower() for x in result if isinstance(x, str)]
 
-    save_to_cache(cache, result, "known_problematic_websites")
-    return result
+        save_to_cache(cache, {url: result}, "known_lists")
+        save_to_cache(
+            cache, {url: response.headers.get("Last-Modified", None)}, "last_modified"
+        )
+
+        return result
+
+    return single_flight(("known_list", url), fetch, expires_at)
+
+
+def get_known_problematic_websites(cache, expires_at: float = None) -> set:
+    """
+    Retrieve every known problematic website from the lists in `KNOWN_LISTS`.
+
+    Each list is fetched at most once a day and saved in the day cache.
+
+    Args:
+        cache: The cache to use.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+
+    Returns:
+        A set of known problematic websites.
+    """
+    known_problematic_websites = set()
+
+    for url in KNOWN_LISTS.keys():
+        known_problematic_websites.update(
+            extract_known_problematic_websites(cache, url, expires_at)
+        )
+
+    return known_problematic_websites
 
 
 def extract_known_problematic_websites_csv(csv_file: str) -> list:
@@ -299,186 +796,1125 @@ def extract_known_problematic_websites_csv(csv_file: str) -> list:
     return result
 
 
-def get_wiki_page(title: str):
+def get_redirect_targets(titles: list, expires_at: float = None) -> dict:
     """
-    Get the content of a Wikipedia page.
+    Look up titles in the redirect map.
 
-    This strategy is taken since the Wikipedia Categories API returns the category
-    associated with a redirect, not the page to which the redirects -- which may
-    involve one or more hops -- point.
+    The redirect map is saved in the cache backend under `REDIRECTS_CACHE` rather than in
+    a day cache, so it is kept across days. Titles that are not in the local copy of the
+    map are requested from the cache backend in one batch.
 
     Args:
-        title: The title of the Wikipedia page.
+        titles: The titles of Wikipedia pages.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
 
     Returns:
-        The content of the Wikipedia page.
+        A dictionary of the titles that are redirects to the canonical titles they point to.
     """
+    with cache_lock:
+        missing = [title for title in dict.fromkeys(titles) if title not in redirect_map]
 
-    url = (
-        "https://en.wikipedia.org/w/api.php?action=query&prop=revisions&titles="
-        + title
-        + "&rvslots=*&rvprop=content&formatversion=2&format=json"
-    )
+    if missing:
+        found = get_backend_fields(REDIRECTS_CACHE, "redirects", missing, expires_at)
 
-    response = requests.get(url, headers={"User-Agent": "Mozilla/5.0"})
+        with cache_lock:
+            redirect_map.update(found)
 
-    response_code = response.status_code
+    with cache_lock:
+        return {
+            title: redirect_map[title]
+            for title in titles
+            if redirect_map.get(title) is not None
+        }
 
-    if response_code != 200:
-        return None, response_code
 
-    if "missing" in response.json()["query"]["pages"][0]:
-        return None, 404
+def save_redirects(redirects: dict):
+    """
+    Add redirects to the redirect map.
 
-    content = response.json()["query"]["pages"][0]["revisions"][0]["slots"]["main"][
-        "content"
-    ]
+    Args:
+        redirects: A dictionary of titles to the canonical titles they point to, or to
+            None for titles that no longer redirect.
 
-    if content.startswith("#REDIRECT"):
-        text = re.search(r"\[\[(.*?)\]\]", content).group(1)
+    Returns:
+        None
+    """
+    known_redirects = get_redirect_targets(list(redirects))
+
+    new_redirects = {
+        title: canonical_title
+        for title, canonical_title in redirects.items()
+        if known_redirects.get(title) != canonical_title
+    }
 
-        if "#" in text:
-            text = text.split("#")[0]
+    if not new_redirects:
+        return
 
-        return get_wiki_page(text)
+    with cache_lock:
+        redirect_map.update(new_redirects)
 
-    return content, response_code
+    cache_backend.set_fields(REDIRECTS_CACHE, "redirects", new_redirects)
 
 
-def get_sentiment(text: str) -> str:
+def get_wiki_page(title: str, expires_at: float = None, revisions: dict = None):
     """
-    Get the sentiment of a category.
+    Get the content of a Wikipedia page.
+
+    This strategy is taken since the Wikipedia Categories API returns the category
+    associated with a redirect, not the page to which the redirects -- which may
+    involve one or more hops -- point.
+
+    Redirects are followed for up to `MAX_REDIRECTS` hops and saved in the redirect map,
+    so later lookups of a title go straight to its canonical page. Redirect loops and
+    longer chains are treated as missing pages.
 
     Args:
-        text: The text to get the sentiment of.
+        title: The title of the Wikipedia page.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+        revisions: If given, the titles visited are added to this dictionary in order, ending
+            with the canonical title and its revision ID. Missing pages have a revision ID of None.
 
     Returns:
-        The sentiment of the text.
+        The content of the Wikipedia page.
     """
+    # every title seen on the way to the canonical page, including unnormalized titles
+    aliases = []
+    hops = 0
 
-    inputs = tokenizer(text, return_tensors="pt")
-    outputs = model(**inputs)
-    logits = outputs.logits
-    predicted_class_idx = torch.argmax(logits).item()
-    id2label = model.config.id2label[predicted_class_idx]
-    # if LABEL_1 or confidence of LABEL_0 < 0.8
-    return (
-        "positive"
-        if id2label == "LABEL_1"
-        or torch.softmax(logits, dim=1)[0][0] < SENTIMENT_CLASSIFIER_CONFIDENCE
-        else "negative"
-    )
+    while True:
+        if title in aliases:
+            print("Redirect loop at", title)
+            return None, 404
 
+        if hops > MAX_REDIRECTS:
+            print("Too many redirects at", title)
+            return None, 404
 
-def generate_report(url: str, consensus = True) -> dict:
-    """
-    Generate a report for a given URL.
+        aliases.append(title)
 
-    The report contains the following:
+        canonical_title = get_redirect_targets([title], expires_at).get(title)
 
-    - Flagged categories
-    - Negative sentiment categories
-    - Known problematic websites
+        if canonical_title is not None and canonical_title not in aliases:
+            if revisions is not None:
+                revisions.setdefault(title, None)
+
+            title = canonical_title
+            hops += 1
+            continue
+
+        url = (
+            "https://en.wikipedia.org/w/api.php?action=query&prop=revisions&titles="
+            + title
+            + "&rvslots=*&rvprop=content|ids&formatversion=2&format=json"
+        )
+
+        response = get_with_deadline(url, {"User-Agent": "Mozilla/5.0"}, expires_at)
+
+        response_code = response.status_code
+
+        if response_code != 200:
+            return None, response_code
+
+        page = response.json()["query"]["pages"][0]
+        page_title = page.get("title", title)
+
+        if page_title != title:
+            aliases.append(page_title)
+
+        if "missing" in page:
+            if revisions is not None:
+                revisions[page_title] = None
+
+            return None, 404
+
+        revision = page["revisions"][0]
+
+        if revisions is not None:
+            revisions[page_title] = revision["revid"]
+
+        content = revision["slots"]["main"]["content"]
+
+        if not content.startswith("#REDIRECT"):
+            break
+
+        title = re.search(r"\[\[(.*?)\]\]", content).group(1)
+        hops += 1
+
+        if "#" in title:
+            title = title.split("#")[0]
+
+    if hops > 0:
+        save_redirects({alias: page_title for alias in aliases if alias != page_title})
+
+    return content, response_code
+
+
+def get_latest_revisions(titles: list, expires_at: float = None) -> dict:
+    """
+    Get the canonical title and latest revision ID of several Wikipedia pages without downloading their content.
+
+    Titles are requested `REVALIDATION_BATCH_SIZE` at a time. Redirects are resolved by
+    the API and saved in the redirect map, and titles in the map that no longer redirect
+    are removed from it.
 
     Args:
-        url: The URL to generate the report for.
-        consensus: Whether to use a consensus strategy.
+        titles: The titles of the Wikipedia pages.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
 
     Returns:
-        A dictionary containing the report.
+        A dictionary of titles to tuples of their canonical title and its revision ID, with a
+        revision ID of None for missing pages. Titles in batches that could not be requested,
+        and titles in redirect loops, are left out.
+    """
+    titles = list(dict.fromkeys(titles))
+    latest_revisions = {}
 
-    Example:
-        ```python
-            >>> generate_report("https://www.abcnews.com.co")
-            {
-                "flagged_categories": [],
-                "negative_sentiment_categories": [],
-                "known_problematic_websites": [],
-                "all_categories": []
-            }
-        ```
+    for i in range(0, len(titles), REVALIDATION_BATCH_SIZE):
+        batch = titles[i : i + REVALIDATION_BATCH_SIZE]
+
+        url = (
+            "https://en.wikipedia.org/w/api.php?action=query&prop=info&redirects=1&titles="
+            + quote("|".join(batch))
+            + "&formatversion=2&format=json"
+        )
+
+        response = get_with_deadline(url, {"User-Agent": "Mozilla/5.0"}, expires_at)
+
+        if response.status_code != 200:
+            continue
+
+        query = response.json()["query"]
+        # titles are returned normalized, such as with a capitalized first letter
+        normalized = {item["from"]: item["to"] for item in query.get("normalized", [])}
+        redirects = {item["from"]: item["to"] for item in query.get("redirects", [])}
+        pages = {page["title"]: page for page in query.get("pages", [])}
+
+        known_redirects = get_redirect_targets(batch + list(normalized.values()), expires_at)
+        new_redirects = {}
+
+        for title in batch:
+            canonical_title = normalized.get(title, title)
+            hops = []
+
+            while canonical_title in redirects and canonical_title not in hops:
+                hops.append(canonical_title)
+                canonical_title = redirects[canonical_title]
+
+            page = pages.get(canonical_title)
+
+            if page is None or canonical_title in redirects or len(hops) > MAX_REDIRECTS:
+                continue
+
+            if "missing" in page or "invalid" in page:
+                latest_revisions[title] = (canonical_title, None)
+            else:
+                latest_revisions[title] = (canonical_title, page["lastrevid"])
+
+            # titles that were only normalized are not redirects
+            if hops:
+                new_redirects.update({alias: canonical_title for alias in [title] + hops})
+            else:
+                # titles in the redirect map that are now pages, or missing, are requested directly again
+                for alias in (title, canonical_title):
+                    if alias in known_redirects:
+                        new_redirects[alias] = None
+
+        save_redirects(new_redirects)
+
+    return latest_revisions
+
+
+def get_previous_revisions(domains: list, expires_at: float = None) -> dict:
+    """
+    Find the most recent categories and revision IDs saved for each domain before today.
+
+    Only the last `REVALIDATION_DAYS` days are searched, in one request to the cache backend.
+
+    Args:
+        domains: The domains to look up.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+
+    Returns:
+        A dictionary of domains to tuples of their revisions and categories.
+    """
+    domains = list(dict.fromkeys(domains))
+
+    if not domains:
+        return {}
+
+    days = get_recent_days(REVALIDATION_DAYS + 1)[1:]
+    reads = [(day, key, domains) for day in days for key in ("revisions", "categories")]
+    sections = get_many_backend_fields(reads, expires_at)
+
+    previous_revisions = {}
+
+    # newest first, so each domain keeps its most recent day
+    for revisions, categories in zip(sections[::2], sections[1::2]):
+        for domain, domain_revisions in revisions.items():
+            if domain in categories and domain not in previous_revisions:
+                previous_revisions[domain] = (domain_revisions, categories[domain])
+
+    return previous_revisions
+
+
+def revalidate_categories(cache, domains: list, expires_at: float = None) -> list:
+    """
+    Reuse categories saved on a previous day for domains whose Wikipedia pages have not changed.
+
+    The canonical page and its revision ID are checked for each domain in batches with
+    `get_latest_revisions`, so edited pages and redirects that now point elsewhere are
+    both fetched again. Unchanged domains have their categories and revision IDs saved
+    in today's cache.
+
+    Domains in the redirect map are checked in the same batches even if they have no
+    saved revision IDs, so a redirect that was changed or removed is not followed.
+
+    Args:
+        cache: Today's cache.
+        domains: The domains to revalidate.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+
+    Returns:
+        A list of domains that need to be fetched again, because their pages changed or
+        they have no saved revision IDs.
+    """
+    previous_revisions = {
+        domain: (domain_revisions, categories)
+        for domain, (domain_revisions, categories) in get_previous_revisions(
+            domains, expires_at
+        ).items()
+        if domain_revisions
+    }
+
+    redirected_domains = [
+        domain
+        for domain in get_redirect_targets(domains, expires_at)
+        if domain not in previous_revisions
+    ]
+
+    # pages are looked up by domain, so redirects are saved for the titles get_wiki_page requests
+    latest_revisions = get_latest_revisions(
+        list(previous_revisions) + redirected_domains, expires_at
+    )
+
+    unchanged_revisions = {}
+    unchanged_categories = {}
+
+    for domain, (domain_revisions, categories) in previous_revisions.items():
+        # the last title visited is the canonical page
+        canonical_title, revid = list(domain_revisions.items())[-1]
+
+        if latest_revisions.get(domain) == (canonical_title, revid):
+            unchanged_revisions[domain] = domain_revisions
+            unchanged_categories[domain] = categories
+
+    if unchanged_categories:
+        save_to_cache(cache, unchanged_revisions, "revisions")
+        save_to_cache(cache, unchanged_categories, "categories")
+
+    return [domain for domain in dict.fromkeys(domains) if domain not in unchanged_categories]
+
+
+def load_sentiment_model():
+    """
+    Load the sentiment model, unless it is already loaded.
+
+    The model is loaded on first use, so commands and lookups that never classify a
+    category do not pay for importing torch or downloading the model.
+
+    Returns:
+        A tuple of the tokenizer and the model.
+    """
+    global tokenizer
+    global model
+
+    with model_lock:
+        if model is None:
+            from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_MODEL)
+            model = AutoModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL)
+
+    return tokenizer, model
+
+
+def get_sentiment(text: str) -> str:
+    """
+    Get the sentiment of a category.
+
+    Args:
+        text: The text to get the sentiment of.
+
+    Returns:
+        The sentiment of the text.
+    """
+    import torch
+
+    tokenizer, model = load_sentiment_model()
+
+    inputs = tokenizer(text, return_tensors="pt")
+    outputs = model(**inputs)
+    logits = outputs.logits
+    predicted_class_idx = torch.argmax(logits).item()
+    id2label = model.config.id2label[predicted_class_idx]
+    # if LABEL_1 or confidence of LABEL_0 < 0.8
+    return (
+        "positive"
+        if id2label == "LABEL_1"
+        or torch.softmax(logits, dim=1)[0][0] < SENTIMENT_CLASSIFIER_CONFIDENCE
+        else "negative"
+    )
+
+
+def get_sentiments(texts: list) -> list:
+    """
+    Get the sentiment of several categories in one forward pass.
+
+    Args:
+        texts: The texts to get the sentiment of.
+
+    Returns:
+        The sentiment of each text, in order.
+    """
+    if not texts:
+        return []
+
+    import torch
+
+    tokenizer, model = load_sentiment_model()
+
+    inputs = tokenizer(texts, return_tensors="pt", padding=True, truncation=True)
+
+    with torch.no_grad():
+        logits = model(**inputs).logits
+
+    probabilities = torch.softmax(logits, dim=1)
+    predicted_class_idxs = torch.argmax(logits, dim=1).tolist()
+
+    # same rule as get_sentiment, applied to each row
+    return [
+        "positive"
+        if model.config.id2label[predicted_class_idx] == "LABEL_1"
+        or probabilities[i][0] < SENTIMENT_CLASSIFIER_CONFIDENCE
+        else "negative"
+        for i, predicted_class_idx in enumerate(predicted_class_idxs)
+    ]
+
+
+def get_categories(cache, domain: str, expires_at: float = None, revalidate: bool = True):
+    """
+    Retrieve the categories of the Wikipedia page for a domain.
+
+    Pages are fetched at most once a day. Missing pages are saved in the day cache too,
+    so domains without a Wikipedia page are not looked up again until tomorrow.
+    Concurrent callers for the same domain share one fetch.
+
+    The revision IDs of the pages are saved too. If a domain was looked up on a previous
+    day, its categories are reused unless its pages have changed since.
+
+    Args:
+        cache: The cache to use.
+        domain: The domain to retrieve categories for.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+        revalidate: Whether to check if categories saved on a previous day are still current before fetching.
+
+    Returns:
+        A list of categories, or None if the domain has no Wikipedia page.
+    """
+    cached_categories = get_cached_fields(cache, "categories", [domain], expires_at)
+
+    if domain in cached_categories:
+        return cached_categories[domain]
+
+    def fetch():
+        # another caller may have saved the categories since they were checked
+        cached_categories = get_cached_fields(cache, "categories", [domain], expires_at)
+
+        if domain in cached_categories:
+            return cached_categories[domain]
+
+        if revalidate and not revalidate_categories(cache, [domain], expires_at):
+            return get_cached_fields(cache, "categories", [domain])[domain]
+
+        revisions = {}
+        result, status_code = get_wiki_page(domain, expires_at, revisions)
+
+        if status_code == 404:
+            categories = None
+        elif status_code != 200:
+            # do not cache transient errors
+            return None
+        else:
+            categories = extract_categories(result)
+
+        save_to_cache(cache, {domain: revisions}, "revisions")
+        save_to_cache(cache, {domain: categories}, "categories")
+
+        return categories
+
+    return single_flight(("categories", domain), fetch, expires_at)
+
+
+def get_sentiment_fingerprint() -> str:
+    """
+    Fingerprint the configuration that category sentiments depend on.
+
+    Sentiments are saved under this fingerprint, so changing the sentiment model, its
+    threshold, the cascade setting or, if the cascade is on, recalibrating it means
+    categories are classified again.
+
+    Returns:
+        A hex digest.
+    """
+    config = {
+        "sentiment_model": SENTIMENT_MODEL,
+        "sentiment_classifier_confidence": SENTIMENT_CLASSIFIER_CONFIDENCE,
+        "sentiment_cascade": SENTIMENT_CASCADE,
+    }
+
+    if SENTIMENT_CASCADE:
+        # imported here since the cascade module imports this one
+        from disinfodomains.cascade import get_cascade_version
+
+        config["cascade_version"] = get_cascade_version()
+
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def get_cached_sentiments(
+    cache, categories: list, fingerprint: str = None, expires_at: float = None
+) -> dict:
+    """
+    Look up the sentiments saved in today's cache for the current sentiment configuration.
+
+    Args:
+        cache: Today's cache.
+        categories: The categories to look up.
+        fingerprint: The fingerprint from `get_sentiment_fingerprint`, if already computed.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+
+    Returns:
+        A dictionary of the categories that were found to their sentiments.
+    """
+    prefix = (fingerprint or get_sentiment_fingerprint()) + ":"
+
+    cached_sentiments = get_cached_fields(
+        cache, "sentiments", [prefix + category for category in categories], expires_at
+    )
+
+    return {key[len(prefix) :]: sentiment for key, sentiment in cached_sentiments.items()}
+
+
+def save_sentiments(cache, sentiments: dict, fingerprint: str = None):
+    """
+    Save category sentiments in today's cache under the current sentiment configuration.
+
+    Args:
+        cache: Today's cache.
+        sentiments: A dictionary of categories to sentiments.
+        fingerprint: The fingerprint from `get_sentiment_fingerprint`, if already computed.
+
+    Returns:
+        None
     """
+    prefix = (fingerprint or get_sentiment_fingerprint()) + ":"
+
+    save_to_cache(
+        cache,
+        {prefix + category: sentiment for category, sentiment in sentiments.items()},
+        "sentiments",
+    )
+
+
+def get_category_sentiments(cache, categories: list, expires_at: float = None) -> dict:
+    """
+    Get the sentiment of each category, reusing sentiments saved in the day cache.
+
+    Sentiments are reused only if they were classified with the current model, threshold
+    and cascade setting. Uncached categories are classified in batches of `SENTIMENT_BATCH_SIZE`, and each
+    batch is saved as soon as it is classified. Concurrent callers with the same
+    uncached categories share one classification.
+
+    Args:
+        cache: The cache to use.
+        categories: The categories to get the sentiment of.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+
+    Returns:
+        A dictionary of categories to sentiments.
+    """
+    fingerprint = get_sentiment_fingerprint()
+    cached_sentiments = get_cached_sentiments(cache, categories, fingerprint, expires_at)
+
+    uncached_categories = list(
+        dict.fromkeys(category for category in categories if category not in cached_sentiments)
+    )
+
+    def classify():
+        # another caller may have saved some of the sentiments since they were checked
+        new_sentiments = get_cached_sentiments(
+            cache, uncached_categories, fingerprint, expires_at
+        )
+
+        remaining_categories = [
+            category for category in uncached_categories if category not in new_sentiments
+        ]
+
+        for i in range(0, len(remaining_categories), SENTIMENT_BATCH_SIZE):
+            time_remaining(expires_at)
+
+            batch = remaining_categories[i : i + SENTIMENT_BATCH_SIZE]
+
+            if SENTIMENT_CASCADE:
+                from disinfodomains.cascade import classify_categories
 
+                batch_sentiments = classify_categories(batch)
+            else:
+                batch_sentiments = dict(zip(batch, get_sentiments(batch)))
+
+            save_sentiments(cache, batch_sentiments, fingerprint)
+            new_sentiments.update(batch_sentiments)
+
+        return new_sentiments
+
+    new_sentiments = {}
+
+    if uncached_categories:
+        new_sentiments = single_flight(
+            ("sentiments", fingerprint, tuple(uncached_categories)), classify, expires_at
+        )
+
+    return {
+        category: new_sentiments.get(category) or cached_sentiments[category]
+        for category in categories
+    }
+
+
+def save_negative_sentiment_categories(cache, domain: str, categories: list):
+    """
+    Save a domain's negative sentiment categories in today's cache, unless they are already saved.
+
+    Concurrent reports for a domain find the same categories, so only the first writes them.
+
+    Args:
+        cache: Today's cache.
+        domain: The domain.
+        categories: The domain's negative sentiment categories.
+
+    Returns:
+        None
+    """
+    day = today()
+
+    # checked and merged under one lock; the backend write happens outside it
+    with cache_lock:
+        is_new = not set(categories) <= set(cache.get(domain, []))
+
+        if is_new:
+            merge_into_cache(cache, categories, domain, day)
+
+    if is_new:
+        write_to_cache_backend(categories, domain, day)
+
+
+def fill_cache(cache, domain: str, expires_at: float = None, revalidate: bool = True):
+    """
+    Save everything a report for a domain needs in today's cache.
+
+    Args:
+        cache: Today's cache.
+        domain: The domain to fill the cache for.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+        revalidate: Whether to revalidate categories saved on a previous day, if the caller has not already.
+
+    Returns:
+        None
+    """
+    get_known_problematic_websites(cache, expires_at)
+
+    categories = get_categories(cache, domain, expires_at, revalidate)
+
+    if categories is None:
+        return
+
+    sentiments = get_category_sentiments(cache, categories, expires_at)
+
+    negative_sentiment_categories = [
+        category for category, sentiment in sentiments.items() if sentiment == "negative"
+    ]
+
+    # saved so consensus has today's data
+    if negative_sentiment_categories:
+        save_negative_sentiment_categories(cache, domain, negative_sentiment_categories)
+
+
+def fill_cache_in_background(cache, domain: str):
+    """
+    Finish filling today's cache for a domain on a background thread.
+
+    Used when a report's deadline passes, so the next report for the domain is fast.
+    A domain is only filled by one background thread at a time.
+
+    Args:
+        cache: Today's cache.
+        domain: The domain to fill the cache for.
+
+    Returns:
+        None
+    """
+    global background_executor
+
+    with cache_lock:
+        if domain in background_domains:
+            return
+
+        background_domains.add(domain)
+
+        if background_executor is None:
+            background_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS)
+
+    def fill():
+        try:
+            fill_cache(cache, domain)
+        except Exception as e:
+            print("Error filling cache for", domain, e)
+        finally:
+            with cache_lock:
+                background_domains.discard(domain)
+
+    background_executor.submit(fill)
+
+
+def normalize_domain(url: str) -> str:
+    """
+    Get the domain of a URL, without a leading "www.".
+
+    Args:
+        url: A URL or bare domain.
+
+    Returns:
+        The lowercased domain.
+    """
     if not validators.url(url):
         url = "https://" + url
 
-    domain = urlparse(url).netloc
+    # lowercased first, so "WWW." is stripped too
+    domain = urlparse(url).netloc.strip().lower()
 
     if domain.startswith("www."):
         domain = domain[4:]
 
-    domain = domain.strip()
+    return domain
+
 
-    report = {
+def match_flagged_categories(categories: list) -> list:
+    """
+    Find which groups in `CATEGORIES_TO_FLAG` match any of a page's categories.
+
+    Args:
+        categories: The categories of a Wikipedia page.
+
+    Returns:
+        A list of matching groups, such as "Satire".
+    """
+    return [
+        flagged_category
+        for flagged_category, regexes in CATEGORIES_TO_FLAG.items()
+        if any(regex.search(category) for regex in regexes for category in categories)
+    ]
+
+
+def is_flagged_by_cheap_checks(report: dict) -> bool:
+    """
+    The default fast verdict condition: the domain is on a known list or in a flagged category.
+
+    Args:
+        report: A partial report.
+
+    Returns:
+        Whether the report is enough to flag the domain.
+    """
+    return any(len(report[key]) > 0 for key in FAST_VERDICT_KEYS)
+
+
+def new_report() -> dict:
+    """
+    Create an empty report.
+
+    Returns:
+        A report with no findings.
+    """
+    return {
         "flagged_categories": [],
         "negative_sentiment_categories": [],
         "known_problematic_websites": [],
         "all_categories": [],
     }
 
-    # if domain is in cache, return it
+
+def get_config_fingerprint(consensus=True) -> str:
+    """
+    Fingerprint the configuration that a report depends on.
+
+    Reports are only reused while `CATEGORIES_TO_FLAG`, the known lists, the consensus
+    strategy and the sentiment model and threshold are unchanged.
+
+    Args:
+        consensus: Whether the report uses a consensus strategy.
+
+    Returns:
+        A hex digest.
+    """
+    config = {
+        "categories_to_flag": {
+            name: [[regex.pattern, regex.flags] for regex in regexes]
+            for name, regexes in CATEGORIES_TO_FLAG.items()
+        },
+        "known_lists": KNOWN_LISTS,
+        "known_csv_lists": KNOWN_CSV_LISTS,
+        "consensus_strategy": CONSENSUS_STRATEGY if consensus else None,
+        "sentiments": get_sentiment_fingerprint(),
+    }
+
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def get_cached_report(domain: str, fingerprint: str, expires_at: float = None) -> dict:
+    """
+    Look up a complete report in memory, then in today's cache backend.
+
+    Args:
+        domain: The normalized domain.
+        fingerprint: The configuration fingerprint from `get_config_fingerprint`.
+        expires_at: A `time.monotonic()` value after which to give up, or None for no deadline.
+
+    Returns:
+        A copy of the report, or None if there is no report younger than `REPORT_CACHE_TTL` seconds.
+    """
+    if REPORT_CACHE_TTL <= 0:
+        return None
+
+    key = fingerprint + ":" + domain
+
+    with cache_lock:
+        entry = report_cache.get(key)
+
+        if entry is not None:
+            report_cache.move_to_end(key)
+
+    if entry is None:
+        entry = get_backend_fields(today(), "reports", [key], expires_at).get(key)
+
+        if entry is not None:
+            with cache_lock:
+                report_cache[key] = entry
+
+    if entry is None or time.time() - entry["created"] > REPORT_CACHE_TTL:
+        return None
+
+    return {name: list(value) for name, value in entry["report"].items()}
+
+
+def save_report(domain: str, fingerprint: str, report: dict):
+    """
+    Save a complete report in memory and in today's cache backend.
+
+    Args:
+        domain: The normalized domain.
+        fingerprint: The configuration fingerprint from `get_config_fingerprint`.
+        report: The report.
+
+    Returns:
+        None
+    """
+    if REPORT_CACHE_TTL <= 0:
+        return
+
+    key = fingerprint + ":" + domain
+    # copied so callers can change the report they were given
+    entry = {
+        "report": {name: list(value) for name, value in report.items()},
+        "created": time.time(),
+    }
+
+    with cache_lock:
+        report_cache[key] = entry
+        report_cache.move_to_end(key)
+
+        while len(report_cache) > REPORT_CACHE_SIZE:
+            report_cache.popitem(last=False)
+
+    cache_backend.set_fields(today(), "reports", {key: entry})
+
+
+def generate_report_progressive(url: str, consensus = True, deadline: float = None):
+    """
+    Generate a report for a given URL, yielding a partial report after each stage.
+
+    Stages run from cheapest to most expensive:
+
+    - known_lists: Check the known problematic websites lists.
+    - cached_categories: Read the domain's categories from today's cache.
+    - rules: Match cached categories against `CATEGORIES_TO_FLAG`.
+    - fetch: Fetch the domain's Wikipedia page, if its categories were not cached, and match its categories.
+    - sentiment: Classify the sentiment of each category.
+    - consensus: Apply the consensus strategy to negative sentiment categories.
+
+    Stop iterating at any point to skip the remaining stages.
+
+    If a deadline is given and passes during a stage, no more stages are yielded and the
+    rest of the work continues on a background thread to fill today's cache. The one
+    exception is a known list that could not be fetched in time: the known_lists stage
+    is skipped, but the domain is still checked against the lists that are cached and
+    the later stages still run, so categories and sentiments already in the cache are used.
+
+    Args:
+        url: The URL to generate the report for.
+        consensus: Whether to use a consensus strategy.
+        deadline: The number of seconds the report may take, or None for no deadline.
+
+    Yields:
+        A dictionary with the name of the stage, the seconds elapsed since the
+        start of the report and a copy of the report so far.
+    """
+    start = time.perf_counter()
+    expires_at = time.monotonic() + deadline if deadline is not None else None
+
+    def partial(stage):
+        return {
+            "stage": stage,
+            "elapsed": time.perf_counter() - start,
+            "report": {key: list(value) for key, value in report.items()},
+        }
+
+    domain = normalize_domain(url)
+
+    report = new_report()
+
     cache = get_day_cache()
 
-    if domain in cache:
-        result, status_code = None, 200
+    record_hit(cache, domain)
 
-    result, status_code = get_wiki_page(domain)
+    known_lists_complete = True
 
-    if status_code != 404:
-        if domain in cache:
-            categories = cache[domain]
-        else:
-            categories = extract_categories(result)
+    try:
+        for known_list in KNOWN_LISTS.keys():
+            try:
+                known_problematic_websites = extract_known_problematic_websites(
+                    cache, known_list, expires_at
+                )
+            except DeadlineExceeded:
+                # one slow list should not hide what the cache already knows
+                known_lists_complete = False
+                continue
+
+            if domain in known_problematic_websites:
+                report["known_problematic_websites"] = [domain]
+
+        for site in KNOWN_CSV_LISTS.keys():
+            if domain in extract_known_problematic_websites_csv(site):
+                report["known_problematic_websites"].append(domain)
+
+        if known_lists_complete:
+            yield partial("known_lists")
+
+        cached_categories = get_cached_fields(cache, "categories", [domain], expires_at)
+        categories = cached_categories.get(domain)
+
+        if categories is not None:
+            report["all_categories"] = categories
+
+        yield partial("cached_categories")
+
+        if categories is not None:
+            report["flagged_categories"] = match_flagged_categories(categories)
+
+        yield partial("rules")
+
+        if domain not in cached_categories:
+            categories = get_categories(cache, domain, expires_at)
 
-        sentiments = {category: get_sentiment(category) for category in categories}
+            if categories is not None:
+                report["all_categories"] = categories
+                report["flagged_categories"] = match_flagged_categories(categories)
 
-        report["all_categories"] = categories
+        yield partial("fetch")
+
+        negative_sentiment_categories_today = []
+
+        if categories is not None:
+            sentiments = get_category_sentiments(cache, categories, expires_at)
 
-        if any(sentiment == "negative" for sentiment in sentiments.values()):
             negative_sentiment_categories_today = [
                 category
                 for category, sentiment in sentiments.items()
                 if sentiment == "negative"
             ]
 
-            save_to_cache(cache, negative_sentiment_categories_today, domain)
+        report["negative_sentiment_categories"] = negative_sentiment_categories_today
 
-            if consensus:
-                consensus_report = get_consensus(domain, consensus_strategy=CONSENSUS_STRATEGY)
+        yield partial("sentiment")
 
-                report["negative_sentiment_categories"] = consensus_report
-            else:
-                report["negative_sentiment_categories"] = negative_sentiment_categories_today
-
-        for site in KNOWN_LISTS.keys():
-            if any(
-                domain in extract_known_problematic_websites(cache, site)
-                for domain in sentiments.keys()
-            ):
-                report["known_problematic_websites"].extend(
-                    [
-                        domain
-                        for domain in sentiments.keys()
-                        if domain in extract_known_problematic_websites(cache, site)
-                    ]
+        if negative_sentiment_categories_today:
+            save_negative_sentiment_categories(cache, domain, negative_sentiment_categories_today)
+
+            if consensus:
+                report["negative_sentiment_categories"] = get_consensus(
+                    domain, consensus_strategy=CONSENSUS_STRATEGY, expires_at=expires_at
                 )
 
-        for category, regexes in CATEGORIES_TO_FLAG.items():
-            for regex in regexes:
-                if any(regex.search(category) for category in categories):
-                    report["flagged_categories"].append(category)
-
-    for site in KNOWN_CSV_LISTS.keys():
-        if any(
-            domain in extract_known_problematic_websites_csv(site)
-            for domain in [domain]
-        ):
-            report["known_problematic_websites"].extend(
-                [
-                    domain
-                    for domain in [domain]
-                    if domain in extract_known_problematic_websites_csv(site)
-                ]
-            )
+        yield partial("consensus")
+    except DeadlineExceeded:
+        fill_cache_in_background(cache, domain)
+    else:
+        if not known_lists_complete:
+            fill_cache_in_background(cache, domain)
+
+
+def generate_report(
+    url: str,
+    consensus = True,
+    fast_verdict = False,
+    verdict_condition = None,
+    deadline: float = None,
+    use_report_cache = True,
+) -> dict:
+    """
+    Generate a report for a given URL.
+
+    The report contains the following:
+
+    - Flagged categories
+    - Negative sentiment categories
+    - Known problematic websites
+
+    If a deadline is given, the report also lists its `completed_stages` and
+    `skipped_stages`. Stages skipped because the deadline passed are finished in
+    the background, so a later report for the same domain can use them.
+
+    Complete reports are reused for `REPORT_CACHE_TTL` seconds, for as long as the
+    configuration they were generated with is unchanged.
+
+    Args:
+        url: The URL to generate the report for.
+        consensus: Whether to use a consensus strategy.
+        fast_verdict: Whether to stop as soon as `verdict_condition` is met, skipping more expensive stages.
+        verdict_condition: A function that takes a partial report and returns whether it is enough
+            to decide. Defaults to `is_flagged_by_cheap_checks`.
+        deadline: The number of seconds the report may take, such as 0.15, or None for no deadline.
+        use_report_cache: Whether to reuse and save complete reports.
+
+    Returns:
+        A dictionary containing the report.
+
+    Example:
+        ```python
+            >>> generate_report("https://www.abcnews.com.co")
+            {
+                "flagged_categories": [],
+                "negative_sentiment_categories": [],
+                "known_problematic_websites": [],
+                "all_categories": []
+            }
+        ```
+    """
+    verdict_condition = verdict_condition or is_flagged_by_cheap_checks
+
+    report = None
+    completed_stages = []
+
+    if use_report_cache:
+        domain = normalize_domain(url)
+        fingerprint = get_config_fingerprint(consensus)
+        expires_at = time.monotonic() + deadline if deadline is not None else None
+
+        try:
+            report = get_cached_report(domain, fingerprint, expires_at)
+        except DeadlineExceeded:
+            report = None
+
+        if deadline is not None:
+            # the report cache lookup counts against the deadline
+            deadline = max(expires_at - time.monotonic(), 0)
+
+    if report is not None:
+        record_hit(get_day_cache(), domain)
+        completed_stages = list(REPORT_STAGES)
+    else:
+        report = new_report()
+
+        for partial in generate_report_progressive(url, consensus, deadline):
+            report = partial["report"]
+            completed_stages.append(partial["stage"])
+
+            if fast_verdict and verdict_condition(report):
+                break
+
+        if use_report_cache and len(completed_stages) == len(REPORT_STAGES):
+            save_report(domain, fingerprint, report)
+
+    if deadline is not None:
+        report["completed_stages"] = completed_stages
+        report["skipped_stages"] = [
+            stage for stage in REPORT_STAGES if stage not in completed_stages
+        ]
 
     return report
+
+
+async def generate_report_async(
+    url: str,
+    consensus = True,
+    fast_verdict = False,
+    verdict_condition = None,
+    deadline: float = None,
+    use_report_cache = True,
+) -> dict:
+    """
+    Generate a report for a given URL without blocking the event loop.
+
+    The report is generated on a thread. Concurrent calls for the same domain with the
+    same arguments share one report, and lookups are shared with reports generated on
+    other threads.
+
+    Args:
+        url: The URL to generate the report for.
+        consensus: Whether to use a consensus strategy.
+        fast_verdict: Whether to stop as soon as `verdict_condition` is met, skipping more expensive stages.
+        verdict_condition: A function that takes a partial report and returns whether it is enough
+            to decide. Defaults to `is_flagged_by_cheap_checks`.
+        deadline: The number of seconds the report may take, such as 0.15, or None for no deadline.
+        use_report_cache: Whether to reuse and save complete reports.
+
+    Returns:
+        A dictionary containing the report.
+    """
+    loop = asyncio.get_running_loop()
+
+    key = (
+        loop,
+        normalize_domain(url),
+        consensus,
+        fast_verdict,
+        verdict_condition,
+        deadline,
+        use_report_cache,
+    )
+
+    future = async_in_flight.get(key)
+
+    if future is None:
+        future = loop.run_in_executor(
+            None,
+            lambda: generate_report(
+                url, consensus, fast_verdict, verdict_condition, deadline, use_report_cache
+            ),
+        )
+
+        async_in_flight[key] = future
+        future.add_done_callback(lambda _: async_in_flight.pop(key, None))
+
+    # shielded so a cancelled caller does not cancel the report for the others
+    report = await asyncio.shield(future)
+
+    return {name: list(value) for name, value in report.items()}
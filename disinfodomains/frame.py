@@ -0,0 +1,149 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import disinfodomains.disinfodomains as engine
+from disinfodomains.disinfodomains import (
+    fill_cache,
+    get_cached_fields,
+    get_category_sentiments,
+    get_consensus,
+    get_day_cache,
+    get_known_problematic_websites,
+    match_flagged_categories,
+    revalidate_categories,
+)
+
+SCORE_FRAME_CONCURRENCY = 4
+
+
+def normalize_domains(domains: pd.Series) -> pd.Series:
+    """
+    Normalize a column of URLs or domains the same way as `normalize_domain`, without a Python call per row.
+
+    Args:
+        domains: A column of URLs or bare domains.
+
+    Returns:
+        A column of lowercased domains without a leading "www.". Missing values become "".
+    """
+    domains = domains.astype("string").str.strip().str.lower()
+    # drop the scheme, then keep the network location
+    domains = domains.str.replace(r"^[a-z][a-z0-9+.\-]*://", "", regex=True)
+    domains = domains.str.extract(r"^([^/?#\s]*)", expand=False)
+    domains = domains.str.replace(r"^www\.", "", regex=True)
+
+    return domains.fillna("").astype(object)
+
+
+def object_array(values: list) -> np.ndarray:
+    # filled one item at a time so lists of equal length are not turned into a 2D array
+    array = np.empty(len(values), dtype=object)
+
+    for i, value in enumerate(values):
+        array[i] = value
+
+    return array
+
+
+def score_frame(
+    df: pd.DataFrame,
+    column: str = "domain",
+    consensus: bool = True,
+    fetch: bool = True,
+    concurrency: int = SCORE_FRAME_CONCURRENCY,
+) -> pd.DataFrame:
+    """
+    Score every domain in a DataFrame.
+
+    Domains are normalized and deduplicated first. Only unique domains are checked
+    against the known problematic websites lists and today's cache, and only unique
+    domains that are not cached, and whose Wikipedia pages changed since they were
+    last fetched, are fetched and classified. Results are then broadcast back to every row.
+
+    Args:
+        df: The DataFrame to score.
+        column: The column containing URLs or domains.
+        consensus: Whether to use a consensus strategy.
+        fetch: Whether to fetch and classify domains that are not in today's cache.
+            If False, uncached domains are only checked against the known lists.
+        concurrency: The number of domains to fetch at once.
+
+    Returns:
+        A copy of the DataFrame with these columns added:
+
+        - normalized_domain: The normalized domain.
+        - known_problematic_website: Whether the domain is on a known list.
+        - flagged_categories: The groups in `CATEGORIES_TO_FLAG` that match the domain's categories.
+        - negative_sentiment_categories: The domain's negative sentiment categories.
+        - all_categories: The domain's categories.
+        - flagged: Whether any of the checks above flagged the domain.
+    """
+    domains = normalize_domains(df[column])
+    codes, uniques = pd.factorize(domains)
+    uniques = list(uniques)
+
+    cache = get_day_cache()
+
+    known_problematic_websites = get_known_problematic_websites(cache)
+    is_known = pd.Index(uniques).isin(known_problematic_websites)
+
+    lookups = [domain for domain in uniques if domain]
+    cached_categories = get_cached_fields(cache, "categories", lookups)
+
+    uncached = [domain for domain in lookups if domain not in cached_categories]
+
+    if fetch and uncached:
+        # unchanged pages reuse categories saved on a previous day, so they are not fetched again
+        try:
+            revalidate_categories(cache, uncached)
+        except Exception as e:
+            print("Error revalidating domains", e)
+
+        def fill(domain):
+            try:
+                fill_cache(cache, domain, revalidate=False)
+            except Exception as e:
+                print("Error scoring", domain, e)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(fill, uncached))
+
+        cached_categories.update(get_cached_fields(cache, "categories", uncached))
+
+    all_categories = [cached_categories.get(domain) or [] for domain in uniques]
+
+    sentiments = get_category_sentiments(
+        cache, list(dict.fromkeys(category for categories in all_categories for category in categories))
+    )
+
+    negative_sentiment_categories = [
+        [category for category in categories if sentiments[category] == "negative"]
+        for categories in all_categories
+    ]
+
+    if consensus:
+        negative_sentiment_categories = [
+            get_consensus(domain, consensus_strategy=engine.CONSENSUS_STRATEGY) if negative else negative
+            for domain, negative in zip(uniques, negative_sentiment_categories)
+        ]
+
+    flagged_categories = [match_flagged_categories(categories) for categories in all_categories]
+
+    flagged = is_known | np.array(
+        [
+            bool(flagged or negative)
+            for flagged, negative in zip(flagged_categories, negative_sentiment_categories)
+        ],
+        dtype=bool,
+    )
+
+    return df.assign(
+        normalized_domain=domains.to_numpy(),
+        known_problematic_website=is_known[codes],
+        flagged_categories=object_array(flagged_categories)[codes],
+        negative_sentiment_categories=object_array(negative_sentiment_categories)[codes],
+        all_categories=object_array(all_categories)[codes],
+        flagged=flagged[codes],
+    )
@@ -0,0 +1,242 @@
+import base64
+import datetime
+import json
+import math
+import os
+
+from disinfodomains.disinfodomains import (
+    CACHE_METADATA_KEYS,
+    get_cache_days,
+    get_day_cache,
+    get_known_problematic_websites,
+    normalize_domain,
+)
+
+FILTER_PATH = os.path.join("webext", "known_domains.json")
+FILTER_FALSE_POSITIVE_RATE = 0.001
+# maximum size of the Bloom filter bit array, in bytes
+FILTER_SIZE_BUDGET = 64 * 1024
+
+# 32-bit FNV-1a, mirrored in webext/background.js
+FNV_PRIME = 0x01000193
+FNV_OFFSET_BASIS = 0x811C9DC5
+FNV_SECOND_OFFSET_BASIS = 0x050C5D1F
+
+
+def fnv1a_32(data: bytes, offset_basis: int = FNV_OFFSET_BASIS) -> int:
+    """
+    Hash bytes with 32-bit FNV-1a.
+
+    Args:
+        data: The bytes to hash.
+        offset_basis: The starting value of the hash.
+
+    Returns:
+        The 32-bit hash.
+    """
+    result = offset_basis
+
+    for byte in data:
+        result ^= byte
+        result = (result * FNV_PRIME) & 0xFFFFFFFF
+
+    return result
+
+
+class BloomFilter:
+    """
+    A Bloom filter over strings, using double hashing of two FNV-1a hashes.
+
+    The size is a power of two and the step between positions is odd, so the positions
+    of an item never repeat before wrapping around the bit array.
+    """
+
+    def __init__(self, size: int, hashes: int, bits: bytearray = None):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bits if bits is not None else bytearray((size + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, false_positive_rate: float, size_budget: int = None):
+        """
+        Create a Bloom filter sized for a number of items and a false positive rate.
+
+        The size is rounded up to a power of two, or down if that would exceed `size_budget`.
+
+        Args:
+            capacity: The number of items that will be added.
+            false_positive_rate: The target false positive rate.
+            size_budget: The maximum size of the bit array, in bytes.
+
+        Returns:
+            An empty Bloom filter.
+        """
+        capacity = max(capacity, 1)
+        size = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        size = 1 << max(size - 1, 1).bit_length()
+
+        if size_budget is not None:
+            size = min(size, 1 << ((size_budget * 8).bit_length() - 1))
+
+        hashes = max(1, round(size / capacity * math.log(2)))
+
+        return cls(size, hashes)
+
+    def _positions(self, item: str):
+        data = item.encode("utf-8")
+        first = fnv1a_32(data)
+        # an odd step shares no factor with the power of two size
+        step = fnv1a_32(data, FNV_SECOND_OFFSET_BASIS) | 1
+
+        for i in range(self.hashes):
+            yield (first + i * step) % self.size
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+    def expected_false_positive_rate(self, count: int) -> float:
+        """
+        Estimate the false positive rate after a number of items have been added.
+
+        Args:
+            count: The number of items in the filter.
+
+        Returns:
+            The expected false positive rate.
+        """
+        return (1 - math.exp(-self.hashes * count / self.size)) ** self.hashes
+
+    def to_dict(self) -> dict:
+        return {
+            "size": self.size,
+            "hashes": self.hashes,
+            "bits": base64.b64encode(bytes(self.bits)).decode("ascii"),
+        }
+
+
+def get_cached_domains() -> set:
+    """
+    Retrieve every domain that has been looked up and saved in the day caches.
+
+    Returns:
+        A set of domains.
+    """
+    domains = set()
+
+    for day_name in get_cache_days():
+        day = get_day_cache(day_name)
+        domains.update(key for key in day if key not in CACHE_METADATA_KEYS)
+        domains.update(day.get("categories", {}).keys())
+        domains.update(day.get("hits", {}).keys())
+
+    return domains
+
+
+def build_known_domains_filter(
+    domains: list,
+    check_domains: list = (),
+    false_positive_rate: float = FILTER_FALSE_POSITIVE_RATE,
+    size_budget: int = FILTER_SIZE_BUDGET,
+):
+    """
+    Compile known problematic domains into a Bloom filter plus an exact list of false positives.
+
+    Domains in `check_domains` that are not listed but match the filter are stored
+    in the exact list so the extension never flags them.
+
+    Args:
+        domains: The known problematic domains.
+        check_domains: Unlisted domains used to measure the false positive rate.
+        false_positive_rate: The target false positive rate.
+        size_budget: The maximum size of the Bloom filter bit array, in bytes.
+
+    Returns:
+        A tuple of the serializable filter and a report on its size and false positive rate.
+    """
+    listed = {normalize_domain(domain) for domain in domains if domain.strip()}
+
+    bloom = BloomFilter.for_capacity(len(listed), false_positive_rate, size_budget)
+
+    for domain in listed:
+        bloom.add(domain)
+
+    unlisted = {normalize_domain(domain) for domain in check_domains} - listed
+    false_positives = sorted(domain for domain in unlisted if domain in bloom)
+
+    data = {
+        "generated": datetime.datetime.now().strftime("%Y-%m-%d"),
+        "bloom": bloom.to_dict(),
+        "false_positives": false_positives,
+    }
+
+    report = {
+        "domains": len(listed),
+        "filter_bytes": len(bloom.bits),
+        "file_bytes": len(json.dumps(data)),
+        "size_budget": size_budget,
+        "hashes": bloom.hashes,
+        "target_false_positive_rate": false_positive_rate,
+        "expected_false_positive_rate": bloom.expected_false_positive_rate(len(listed)),
+        "checked_domains": len(unlisted),
+        "false_positives": len(false_positives),
+        "observed_false_positive_rate": len(false_positives) / len(unlisted)
+        if unlisted
+        else None,
+    }
+
+    return data, report
+
+
+def write_known_domains_filter(
+    path: str = FILTER_PATH,
+    check_domains: list = None,
+    false_positive_rate: float = FILTER_FALSE_POSITIVE_RATE,
+    size_budget: int = FILTER_SIZE_BUDGET,
+) -> dict:
+    """
+    Fetch every list in `KNOWN_LISTS` and write the compiled filter for the browser extension.
+
+    The default path, `FILTER_PATH`, is relative to the working directory.
+
+    Args:
+        path: The file to write the filter to.
+        check_domains: Unlisted domains used to measure the false positive rate. Defaults to every cached domain.
+        false_positive_rate: The target false positive rate.
+        size_budget: The maximum size of the Bloom filter bit array, in bytes.
+
+    Returns:
+        A report on the size and false positive rate of the filter.
+
+    Raises:
+        FileNotFoundError: If the directory of `path` does not exist, such as when the default
+            path is used outside the repository root.
+    """
+    # checked before the lists are fetched, so a bad path fails fast
+    directory = os.path.dirname(os.path.abspath(path))
+
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(
+            "Cannot write the filter to %s because %s does not exist. Run build-filter from "
+            "the repository root or pass --output." % (path, directory)
+        )
+
+    domains = get_known_problematic_websites(get_day_cache())
+
+    if check_domains is None:
+        check_domains = get_cached_domains()
+
+    data, report = build_known_domains_filter(
+        sorted(domains), check_domains, false_positive_rate, size_budget
+    )
+
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+    return report
@@ -0,0 +1,359 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+import disinfodomains.disinfodomains as engine
+from disinfodomains.backends import FilesystemBackend
+
+PROFILE_FIXTURES_PATH = os.path.join(".disinfo-domains", "fixtures.json")
+PROFILE_OUTPUT_DIRECTORY = "profile-results"
+# seconds between samples of the call stack for collapsed stacks
+PROFILE_SAMPLE_INTERVAL = 0.001
+# a stage regresses when its time per domain grows by more than this share of the baseline
+PROFILE_REGRESSION_THRESHOLD = 0.2
+# stages faster than this, in seconds per domain, are compared against this instead
+PROFILE_MIN_STAGE_SECONDS = 0.001
+PROFILE_TOP_FUNCTIONS = 25
+
+# functions whose cumulative time is reported as a component, by file name suffix and function name
+PROFILE_COMPONENTS = {
+    "network": [("disinfodomains/profiling.py", "get_with_deadline")],
+    "read_html": [("pandas/io/html.py", "read_html")],
+    "tokenization": [("transformers/tokenization_utils_base.py", "__call__")],
+    "forward_pass": [("torch/nn/modules/module.py", "_call_impl")],
+    "cache_io": [
+        ("json/__init__.py", "dump"),
+        ("json/__init__.py", "load"),
+        ("sqlite3", "execute"),
+        ("disinfodomains/backends.py", "pipeline"),
+    ],
+}
+
+
+class FixtureResponse:
+    """
+    A recorded HTTP response.
+    """
+
+    def __init__(self, status_code: int, headers: dict, text: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class HTTPFixtures:
+    """
+    Record or replay the HTTP requests made while generating reports.
+
+    While active, every request made through `get_with_deadline` is answered from
+    the fixtures file, or made over the network and saved to it when recording.
+    """
+
+    def __init__(self, path: str = PROFILE_FIXTURES_PATH, record: bool = False):
+        self.path = path
+        self.record = record
+        self.responses = {}
+        self.original_get_with_deadline = None
+
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.responses = json.load(f)
+
+    def get_with_deadline(self, url: str, headers: dict, expires_at: float = None):
+        if self.record:
+            response = self.original_get_with_deadline(url, headers, expires_at)
+
+            self.responses[url] = {
+                "status_code": response.status_code,
+                "headers": dict(response.headers),
+                "text": response.text,
+            }
+
+            return response
+
+        if url not in self.responses:
+            raise ValueError("No recorded response for " + url + ". Record fixtures with --record.")
+
+        return FixtureResponse(**self.responses[url])
+
+    def __enter__(self):
+        self.original_get_with_deadline = engine.get_with_deadline
+        engine.get_with_deadline = self.get_with_deadline
+
+        return self
+
+    def __exit__(self, *exc_info):
+        engine.get_with_deadline = self.original_get_with_deadline
+
+        if self.record:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+            with open(self.path, "w") as f:
+                json.dump(self.responses, f)
+
+
+class StackSampler(threading.Thread):
+    """
+    Sample the call stack of a thread at an interval, counting each distinct stack.
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+
+            while frame is not None:
+                code = frame.f_code
+                stack.append(os.path.basename(code.co_filename) + ":" + code.co_name)
+                frame = frame.f_back
+
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def get_component_seconds(stats: pstats.Stats) -> dict:
+    """
+    Sum the cumulative time of the functions in each of `PROFILE_COMPONENTS`.
+
+    Args:
+        stats: The profile of a run.
+
+    Returns:
+        A dictionary of components to seconds.
+    """
+    component_seconds = dict.fromkeys(PROFILE_COMPONENTS, 0.0)
+
+    for (file_name, _, function_name), (_, _, _, cumulative, _) in stats.stats.items():
+        file_name = file_name.replace(os.sep, "/")
+
+        for component, functions in PROFILE_COMPONENTS.items():
+            for suffix, name in functions:
+                # built-in methods have no file, and are named like "<method 'execute' of 'sqlite3.Cursor' objects>"
+                if file_name == "~":
+                    matches = suffix in function_name and "'" + name + "'" in function_name
+                else:
+                    matches = file_name.endswith(suffix) and function_name == name
+
+                if matches:
+                    component_seconds[component] += cumulative
+
+    return component_seconds
+
+
+def get_top_functions(stats: pstats.Stats, n: int = PROFILE_TOP_FUNCTIONS) -> list:
+    """
+    List the functions with the most cumulative time.
+
+    Args:
+        stats: The profile of a run.
+        n: The number of functions to list.
+
+    Returns:
+        A list of dictionaries describing each function, slowest first.
+    """
+    functions = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:n]
+
+    return [
+        {
+            "function": "%s:%d(%s)" % (file_name, line_number, function_name),
+            "calls": calls,
+            "total_seconds": total,
+            "cumulative_seconds": cumulative,
+        }
+        for (file_name, line_number, function_name), (_, calls, total, cumulative, _) in functions
+    ]
+
+
+def profile_corpus(
+    domains: list,
+    output_directory: str = PROFILE_OUTPUT_DIRECTORY,
+    fixtures_path: str = PROFILE_FIXTURES_PATH,
+    record: bool = False,
+    consensus: bool = True,
+    trace_memory: bool = True,
+    sample_interval: float = PROFILE_SAMPLE_INTERVAL,
+) -> dict:
+    """
+    Generate a report for every domain in a corpus against recorded HTTP responses, with profiling enabled.
+
+    Reports are generated against an empty cache in a temporary directory, so runs are
+    comparable. The following files are written to `output_directory`:
+
+    - summary.json: Time and peak memory per stage, time per component and the slowest functions.
+    - functions.txt: The cProfile report, sorted by cumulative time.
+    - profile.prof: The raw cProfile data, for tools such as snakeviz.
+    - stacks.collapsed: Sampled call stacks in the collapsed format used by flamegraph.pl and speedscope.
+    - memory.txt: The lines holding the most memory at the end of the run, if `trace_memory` is set.
+
+    Args:
+        domains: The domains to generate reports for.
+        output_directory: The directory to write the results to.
+        fixtures_path: The file of recorded HTTP responses.
+        record: Whether to make requests over the network and save them to `fixtures_path`.
+        consensus: Whether to use a consensus strategy.
+        trace_memory: Whether to measure memory with tracemalloc, which slows the run down.
+            Peak memory per stage needs `tracemalloc.reset_peak`, added in Python 3.9, so on
+            earlier versions each stage's `peak_bytes` is None and only memory.txt is written.
+        sample_interval: The seconds between samples of the call stack.
+
+    Returns:
+        The summary.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+
+    # tracemalloc.reset_peak was added in Python 3.9
+    trace_stage_memory = trace_memory and hasattr(tracemalloc, "reset_peak")
+
+    if trace_memory and not trace_stage_memory:
+        print("Peak memory per stage needs Python 3.9 or later, so only memory.txt is written")
+
+    stages = {
+        stage: {"seconds": 0.0, "peak_bytes": 0 if trace_stage_memory else None}
+        for stage in engine.REPORT_STAGES
+    }
+
+    previous_backend = engine.cache_backend
+    previous_report_cache_ttl = engine.REPORT_CACHE_TTL
+
+    profiler = cProfile.Profile()
+    sampler = StackSampler(threading.get_ident(), sample_interval)
+
+    with tempfile.TemporaryDirectory() as cache_directory, HTTPFixtures(fixtures_path, record):
+        engine.set_cache_backend(FilesystemBackend(cache_directory))
+        engine.REPORT_CACHE_TTL = 0
+
+        # loaded up front, so the profile covers generating reports rather than importing torch and reading the weights
+        engine.load_sentiment_model()
+
+        if trace_memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        sampler.start()
+        profiler.enable()
+
+        try:
+            for domain in domains:
+                previous_elapsed = 0.0
+
+                if trace_stage_memory:
+                    tracemalloc.reset_peak()
+                    stage_start_bytes = tracemalloc.get_traced_memory()[0]
+
+                for partial in engine.generate_report_progressive(domain, consensus):
+                    stage = stages[partial["stage"]]
+                    stage["seconds"] += partial["elapsed"] - previous_elapsed
+                    previous_elapsed = partial["elapsed"]
+
+                    if trace_stage_memory:
+                        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+                        stage["peak_bytes"] = max(stage["peak_bytes"], peak_bytes - stage_start_bytes)
+
+                        tracemalloc.reset_peak()
+                        stage_start_bytes = current_bytes
+        finally:
+            profiler.disable()
+            sampler.stop()
+            total_seconds = time.perf_counter() - start
+
+            engine.set_cache_backend(previous_backend)
+            engine.REPORT_CACHE_TTL = previous_report_cache_ttl
+
+            if trace_memory:
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+
+    stats = pstats.Stats(profiler)
+
+    for stage in stages.values():
+        stage["seconds_per_domain"] = stage["seconds"] / max(len(domains), 1)
+
+    summary = {
+        "domains": len(domains),
+        "total_seconds": total_seconds,
+        "stages": stages,
+        "components": get_component_seconds(stats),
+        "functions": get_top_functions(stats),
+    }
+
+    with open(os.path.join(output_directory, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+
+    stats.dump_stats(os.path.join(output_directory, "profile.prof"))
+
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats()
+
+    with open(os.path.join(output_directory, "functions.txt"), "w") as f:
+        f.write(report.getvalue())
+
+    with open(os.path.join(output_directory, "stacks.collapsed"), "w") as f:
+        for stack, count in sampler.stacks.most_common():
+            f.write(stack + " " + str(count) + "\n")
+
+    if trace_memory:
+        with open(os.path.join(output_directory, "memory.txt"), "w") as f:
+            for statistic in snapshot.statistics("lineno")[:PROFILE_TOP_FUNCTIONS]:
+                f.write(str(statistic) + "\n")
+
+    return summary
+
+
+def compare_to_baseline(
+    summary: dict,
+    baseline: dict,
+    threshold: float = PROFILE_REGRESSION_THRESHOLD,
+    min_seconds: float = PROFILE_MIN_STAGE_SECONDS,
+) -> list:
+    """
+    Find the stages that are slower than in a baseline.
+
+    Stages are compared by their time per domain, so the corpus can grow between runs.
+
+    Args:
+        summary: The summary of a run, from `profile_corpus`.
+        baseline: The summary of an earlier run.
+        threshold: The share of the baseline time a stage may grow by.
+        min_seconds: Stages faster than this in the baseline, in seconds per domain, are compared against this instead.
+
+    Returns:
+        A list of descriptions of the stages that regressed.
+    """
+    regressions = []
+
+    for stage, baseline_stage in baseline["stages"].items():
+        if stage not in summary["stages"]:
+            continue
+
+        baseline_seconds = baseline_stage["seconds_per_domain"]
+        seconds = summary["stages"][stage]["seconds_per_domain"]
+
+        if seconds > max(baseline_seconds, min_seconds) * (1 + threshold):
+            regressions.append(
+                "%s: %.1f ms per domain, up from %.1f ms"
+                % (stage, seconds * 1000, baseline_seconds * 1000)
+            )
+
+    return regressions
@@ -0,0 +1,471 @@
+import csv
+import gzip
+import hashlib
+import heapq
+import math
+import re
+import sys
+from collections import Counter
+
+import numpy as np
+
+TRAFFIC_SKETCH_WIDTH = 2**16
+TRAFFIC_SKETCH_DEPTH = 4
+TRAFFIC_HLL_PRECISION = 14
+# number of heavy hitters kept, and checked for disinformation
+TRAFFIC_TOP_K = 1000
+# lines counted exactly before being added to the sketches, which bounds memory
+TRAFFIC_CHUNK_LINES = 100000
+TRAFFIC_LOG_FORMATS = ("auto", "proxy", "dns", "csv")
+
+# the first URL on a line is the request URL in Squid and common log format proxy logs
+URL_PATTERN = re.compile(r"\b[a-z][a-z0-9+.\-]*://([^/\s\"'?#]+)", re.IGNORECASE)
+CONNECT_PATTERN = re.compile(r"\bCONNECT\s+([^\s/\"]+)", re.IGNORECASE)
+# BIND ("query: example.com IN A") and dnsmasq ("query[A] example.com from ...")
+DNS_PATTERN = re.compile(r"\bquery(?:\[\w+\])?:?\s+([^\s()]+)", re.IGNORECASE)
+IP_ADDRESS_PATTERN = re.compile(r"^\d{1,3}(\.\d{1,3}){3}$")
+
+
+def open_log(path: str):
+    """
+    Open an access log for reading line by line, decompressing it if it is gzipped.
+
+    Args:
+        path: The path to the log, or "-" for standard input.
+
+    Returns:
+        A text file object.
+    """
+    if path == "-":
+        return sys.stdin
+
+    with open(path, "rb") as f:
+        is_gzipped = f.read(2) == b"\x1f\x8b"
+
+    if is_gzipped:
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+def normalize_host(host: str) -> str:
+    """
+    Normalize a host taken from a log line.
+
+    Args:
+        host: The host, which may include user information and a port.
+
+    Returns:
+        The lowercased domain without a leading "www.", or None if the host is an IP address or not a domain.
+    """
+    host = host.rpartition("@")[2].lower()
+
+    if host.startswith("["):
+        return None
+
+    host = host.partition(":")[0].rstrip(".")
+
+    if host.startswith("www."):
+        host = host[4:]
+
+    if "." not in host or IP_ADDRESS_PATTERN.match(host):
+        return None
+
+    return host
+
+
+def extract_host(line: str, log_format: str = "auto") -> str:
+    """
+    Extract the requested host from a proxy or DNS log line.
+
+    Args:
+        line: The log line.
+        log_format: "proxy", "dns" or "auto" to try both.
+
+    Returns:
+        The normalized host, or None if no host was found.
+    """
+    match = None
+
+    if log_format in ("auto", "proxy"):
+        match = URL_PATTERN.search(line) or CONNECT_PATTERN.search(line)
+
+    if match is None and log_format in ("auto", "dns"):
+        match = DNS_PATTERN.search(line)
+
+    if match is None:
+        return None
+
+    return normalize_host(match.group(1))
+
+
+def extract_hosts(lines, log_format: str = "auto", column=None):
+    """
+    Extract the requested host from each line of an access log.
+
+    Args:
+        lines: An iterable of log lines.
+        log_format: One of "auto", "proxy", "dns" or "csv".
+        column: For CSV logs, the name or index of the column containing hosts or URLs. Defaults to the first column.
+
+    Returns:
+        A generator of normalized hosts, with None for lines without a host.
+    """
+    if log_format not in TRAFFIC_LOG_FORMATS:
+        raise ValueError("Unknown log format: " + str(log_format))
+
+    if log_format != "csv":
+        for line in lines:
+            yield extract_host(line, log_format)
+
+        return
+
+    rows = csv.reader(lines)
+    index = column or 0
+
+    if isinstance(column, str) and not column.isdigit():
+        header = next(rows, [])
+        index = header.index(column)
+
+    index = int(index)
+
+    for row in rows:
+        if len(row) <= index:
+            yield None
+            continue
+
+        value = row[index].strip()
+
+        if "://" in value:
+            match = URL_PATTERN.search(value)
+            yield normalize_host(match.group(1)) if match else None
+        else:
+            yield normalize_host(value.partition("/")[0])
+
+
+def hash_domains(domains: list) -> np.ndarray:
+    return np.array(
+        [
+            int.from_bytes(hashlib.blake2b(domain.encode("utf-8"), digest_size=8).digest(), "little")
+            for domain in domains
+        ],
+        dtype=np.uint64,
+    )
+
+
+class CountMinSketch:
+    """
+    Approximate per-domain counts in fixed memory.
+
+    Estimates are never below the true count, and exceed it by at most
+    `error_bound` with high probability.
+    """
+
+    def __init__(self, width: int = TRAFFIC_SKETCH_WIDTH, depth: int = TRAFFIC_SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def indices(self, hashes: np.ndarray) -> np.ndarray:
+        # derive one column per row from two halves of the hash
+        first = hashes & np.uint64(0xFFFFFFFF)
+        second = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+
+        return ((first[None, :] + rows * second[None, :]) % np.uint64(self.width)).astype(np.int64)
+
+    def add(self, hashes: np.ndarray, counts: np.ndarray):
+        indices = self.indices(hashes)
+
+        for row in range(self.depth):
+            np.add.at(self.table[row], indices[row], counts)
+
+        self.total += int(counts.sum())
+
+    def estimate(self, hashes: np.ndarray) -> np.ndarray:
+        indices = self.indices(hashes)
+
+        return self.table[np.arange(self.depth)[:, None], indices].min(axis=0)
+
+    @property
+    def error_bound(self) -> float:
+        return math.e / self.width * self.total
+
+
+class HyperLogLog:
+    """
+    Approximate the number of distinct domains in fixed memory.
+
+    The standard error is about `1.04 / sqrt(2 ** precision)`.
+    """
+
+    def __init__(self, precision: int = TRAFFIC_HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(2**precision, dtype=np.uint8)
+
+    def add(self, hashes: np.ndarray):
+        remaining_bits = 64 - self.precision
+
+        indices = (hashes >> np.uint64(remaining_bits)).astype(np.int64)
+        remainders = hashes & np.uint64((1 << remaining_bits) - 1)
+
+        # frexp gives the exact bit length of integers below 2 ** 53
+        _, bit_lengths = np.frexp(remainders.astype(np.float64))
+        ranks = (remaining_bits - bit_lengths + 1).astype(np.uint8)
+
+        np.maximum.at(self.registers, indices, ranks)
+
+    def count(self) -> int:
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+
+        estimate = alpha * size * size / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        empty_registers = int(np.count_nonzero(self.registers == 0))
+
+        # use linear counting while most registers are empty
+        if estimate <= 2.5 * size and empty_registers > 0:
+            estimate = size * math.log(size / empty_registers)
+
+        return int(round(estimate))
+
+
+class TopK:
+    """
+    Keep the `k` domains with the highest estimated counts.
+    """
+
+    def __init__(self, k: int = TRAFFIC_TOP_K):
+        if k < 1:
+            raise ValueError("k must be at least 1, not " + str(k))
+
+        self.k = k
+        self.counts = {}
+        # may contain stale entries, which are skipped when they reach the top
+        self.heap = []
+
+    def minimum(self):
+        while self.counts.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+        return self.heap[0]
+
+    def update(self, domain: str, count: int):
+        if domain not in self.counts and len(self.counts) >= self.k:
+            smallest_count, smallest_domain = self.minimum()
+
+            if count <= smallest_count:
+                return
+
+            del self.counts[smallest_domain]
+            heapq.heappop(self.heap)
+
+        self.counts[domain] = count
+        heapq.heappush(self.heap, (count, domain))
+
+        if len(self.heap) > 4 * self.k:
+            self.heap = [(count, domain) for domain, count in self.counts.items()]
+            heapq.heapify(self.heap)
+
+    def items(self) -> list:
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+
+
+class TrafficCounter:
+    """
+    Count domains in a stream of log lines with bounded memory.
+
+    Hosts are counted exactly for `chunk_lines` lines at a time, then added to a
+    count-min sketch, a HyperLogLog and a top-K heap. Hosts in `watched_domains`, such
+    as the known problematic websites, are also remembered however rarely they appear,
+    so they can be reported from the long tail.
+    """
+
+    def __init__(
+        self,
+        top_k: int = TRAFFIC_TOP_K,
+        width: int = TRAFFIC_SKETCH_WIDTH,
+        depth: int = TRAFFIC_SKETCH_DEPTH,
+        precision: int = TRAFFIC_HLL_PRECISION,
+        chunk_lines: int = TRAFFIC_CHUNK_LINES,
+        watched_domains: set = None,
+    ):
+        self.sketch = CountMinSketch(width, depth)
+        self.distinct = HyperLogLog(precision)
+        self.top = TopK(top_k)
+        self.watched_domains = watched_domains or set()
+        self.seen_watched_domains = set()
+        self.chunk_lines = chunk_lines
+        self.chunk = Counter()
+        self.chunk_size = 0
+        self.lines = 0
+        self.unparsed_lines = 0
+
+    def add(self, host: str):
+        self.lines += 1
+
+        if host is None:
+            self.unparsed_lines += 1
+            return
+
+        self.chunk[host] += 1
+        self.chunk_size += 1
+
+        if host in self.watched_domains:
+            self.seen_watched_domains.add(host)
+
+        if self.chunk_size >= self.chunk_lines:
+            self.flush()
+
+    def flush(self):
+        if not self.chunk:
+            return
+
+        domains = list(self.chunk)
+        hashes = hash_domains(domains)
+
+        self.sketch.add(hashes, np.fromiter(self.chunk.values(), dtype=np.int64, count=len(domains)))
+        self.distinct.add(hashes)
+
+        for domain, estimate in zip(domains, self.sketch.estimate(hashes).tolist()):
+            self.top.update(domain, estimate)
+
+        self.chunk = Counter()
+        self.chunk_size = 0
+
+    def watched_items(self) -> list:
+        """
+        Estimate the count of every watched domain seen, most requested first.
+        """
+        self.flush()
+
+        domains = sorted(self.seen_watched_domains)
+
+        if not domains:
+            return []
+
+        counts = self.sketch.estimate(hash_domains(domains)).tolist()
+
+        return sorted(zip(domains, counts), key=lambda item: (-item[1], item[0]))
+
+    def summary(self) -> dict:
+        self.flush()
+
+        return {
+            "lines": self.lines,
+            "unparsed_lines": self.unparsed_lines,
+            "hits": self.sketch.total,
+            "distinct_domains": self.distinct.count(),
+            "count_error_bound": self.sketch.error_bound,
+        }
+
+
+def count_log_domains(
+    paths: list,
+    log_format: str = "auto",
+    column=None,
+    top_k: int = TRAFFIC_TOP_K,
+    watched_domains: set = None,
+) -> TrafficCounter:
+    """
+    Stream access logs and count how often each domain is requested.
+
+    Args:
+        paths: Paths to proxy, DNS or CSV access logs, optionally gzipped.
+        log_format: One of "auto", "proxy", "dns" or "csv".
+        column: For CSV logs, the name or index of the column containing hosts or URLs.
+        top_k: The number of most requested domains to keep.
+        watched_domains: Domains to keep counts for even if they are not among the most requested.
+
+    Returns:
+        A TrafficCounter.
+    """
+    counter = TrafficCounter(top_k, watched_domains=watched_domains)
+
+    for path in paths:
+        f = open_log(path)
+
+        try:
+            for host in extract_hosts(f, log_format, column):
+                counter.add(host)
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+    counter.flush()
+
+    return counter
+
+
+def flagged_traffic_report(
+    paths: list,
+    log_format: str = "auto",
+    column=None,
+    top_k: int = TRAFFIC_TOP_K,
+    consensus: bool = True,
+    fetch: bool = True,
+):
+    """
+    Rank the flagged domains requested in access logs by traffic.
+
+    Every host is checked against the known problematic websites lists as it is read,
+    so listed domains are reported however rarely they are requested. The `top_k` most
+    requested distinct domains are also checked against Wikipedia categories, each once.
+
+    Args:
+        paths: Paths to proxy, DNS or CSV access logs, optionally gzipped.
+        log_format: One of "auto", "proxy", "dns" or "csv".
+        column: For CSV logs, the name or index of the column containing hosts or URLs.
+        top_k: The number of most requested domains to check.
+        consensus: Whether to use a consensus strategy.
+        fetch: Whether to fetch and classify domains that are not in today's cache.
+
+    Returns:
+        A tuple of a list of flagged domains, most requested first, and a summary of the logs.
+    """
+    import pandas as pd
+
+    from disinfodomains.disinfodomains import get_day_cache, get_known_problematic_websites
+    from disinfodomains.frame import score_frame
+
+    known_problematic_websites = get_known_problematic_websites(get_day_cache())
+
+    counter = count_log_domains(paths, log_format, column, top_k, known_problematic_websites)
+    summary = counter.summary()
+
+    # listed domains outside the top K are added with their estimated counts
+    checked_domains = dict(counter.top.items())
+
+    for domain, count in counter.watched_items():
+        checked_domains.setdefault(domain, count)
+
+    summary["checked_domains"] = len(checked_domains)
+    summary["known_problematic_domains_seen"] = len(counter.seen_watched_domains)
+
+    scored = score_frame(
+        pd.DataFrame(
+            sorted(checked_domains.items(), key=lambda item: (-item[1], item[0])),
+            columns=["domain", "hits"],
+        ),
+        consensus=consensus,
+        fetch=fetch,
+    )
+
+    flagged_domains = []
+
+    for row in scored[scored["flagged"]].itertuples(index=False):
+        flagged_domains.append(
+            {
+                "domain": row.domain,
+                "hits": int(row.hits),
+                "share": row.hits / max(summary["hits"], 1),
+                "known_problematic_website": bool(row.known_problematic_website),
+                "flagged_categories": row.flagged_categories,
+                "negative_sentiment_categories": row.negative_sentiment_categories,
+            }
+        )
+
+    summary["flagged_domains"] = len(flagged_domains)
+    summary["flagged_hits"] = sum(domain["hits"] for domain in flagged_domains)
+
+    return flagged_domains, summary
@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from disinfodomains.disinfodomains import (
+    fill_cache,
+    get_cached_fields,
+    get_day_cache,
+    get_hit_counts,
+    get_known_problematic_websites,
+    normalize_domain,
+    revalidate_categories,
+)
+
+WARM_CONCURRENCY = 4
+# number of days of hit counts used to prioritize domains
+WARM_HITS_DAYS = 7
+
+
+def prioritize_domains(domains: list, hit_counts: dict) -> list:
+    """
+    Order domains by recent hit count, keeping the order of the ranked list for ties.
+
+    Args:
+        domains: A ranked list of domains.
+        hit_counts: A dictionary of domains to hit counts.
+
+    Returns:
+        A deduplicated list of normalized domains, most hit first.
+    """
+    ranked = list(dict.fromkeys(normalize_domain(domain) for domain in domains))
+
+    return sorted(ranked, key=lambda domain: -hit_counts.get(domain, 0))
+
+
+def warm_cache(
+    domains: list,
+    request_budget: int = None,
+    concurrency: int = WARM_CONCURRENCY,
+    hits_days: int = WARM_HITS_DAYS,
+) -> dict:
+    """
+    Precompute today's cache for a ranked list of domains ahead of traffic.
+
+    Domains with the most hits over the last `hits_days` days are warmed first.
+    Domains already in today's cache are skipped, so this can be run repeatedly,
+    such as from cron just after midnight. Domains whose Wikipedia pages have not
+    changed since they were last fetched are revalidated in batches instead of fetched.
+
+    Args:
+        domains: A ranked list of domains to warm.
+        request_budget: The maximum number of domains to fetch from Wikipedia. Defaults to no limit.
+        concurrency: The number of domains to fetch at once.
+        hits_days: The number of days of hit counts used to prioritize domains.
+
+    Returns:
+        A dictionary counting domains that were warmed, revalidated, already cached, over budget or failed.
+    """
+    cache = get_day_cache()
+
+    ranked = prioritize_domains(domains, get_hit_counts(hits_days))
+
+    cached_categories = get_cached_fields(cache, "categories", ranked)
+    pending = [domain for domain in ranked if domain not in cached_categories]
+
+    summary = {
+        "warmed": 0,
+        "revalidated": 0,
+        "already_cached": len(ranked) - len(pending),
+        "over_budget": 0,
+        "failed": 0,
+    }
+
+    try:
+        changed = revalidate_categories(cache, pending)
+    except Exception as e:
+        print("Error revalidating domains", e)
+        changed = pending
+
+    summary["revalidated"] = len(pending) - len(changed)
+
+    if request_budget is not None:
+        summary["over_budget"] = max(0, len(changed) - request_budget)
+        over_budget = set(changed[request_budget:])
+        pending = [domain for domain in pending if domain not in over_budget]
+
+    # every report checks the known lists, so refresh them once up front
+    get_known_problematic_websites(cache)
+
+    def warm(domain):
+        try:
+            fill_cache(cache, domain, revalidate=False)
+            return True
+        except Exception as e:
+            print("Error warming", domain, e)
+            return False
+
+    revalidated = set(pending) - set(changed)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for domain, warmed in zip(pending, executor.map(warm, pending)):
+            if not warmed:
+                summary["failed"] += 1
+            elif domain not in revalidated:
+                summary["warmed"] += 1
+
+    return summary
@@ -26,10 +26,14 @@ setuptools.setup(
         "torch",
         "requests",
         "pandas",
+        "numpy",
         "mkdocstrings",
 
     ],
     packages=find_packages(exclude=("tests",)),
+    entry_points={
+        "console_scripts": ["disinfodomains=disinfodomains.cli:main"],
+    },
     extras_require={
         "dev": ["flake8", "black==22.3.0", "isort", "twine", "pytest", "wheel"],
     },
@@ -0,0 +1,269 @@
+import datetime
+import json
+import re
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+WIKIPEDIA = "https://en.wikipedia.org"
+
+
+class WikiHandler(BaseHTTPRequestHandler):
+    """
+    Answers MediaWiki API queries and known list pages from `server.pages` and `server.lists`.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status: int, body: str, content_type: str, headers: dict = None):
+        body = body.encode("utf-8")
+
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up at its deadline
+            pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.server.requests.append(self.path)
+
+        time.sleep(self.server.delays.get(url.path, 0))
+
+        if url.path in self.server.lists:
+            headers = {"Last-Modified": self.server.last_modified}
+
+            if self.headers.get("If-Modified-Since") == self.server.last_modified:
+                self.send(304, "", "text/html", headers)
+                return
+
+            rows = "".join("<tr><td>%s</td></tr>" % domain for domain in self.server.lists[url.path])
+            self.send(200, "<html>\n<table><tr><th>Domain</th></tr>%s</table>\n</html>" % rows, "text/html", headers)
+            return
+
+        query = parse_qs(url.query)
+        pages = []
+        normalized = []
+        redirects = []
+
+        for title in query["titles"][0].split("|"):
+            requested_title = title
+            title = title[:1].upper() + title[1:]
+
+            if title != requested_title:
+                normalized.append({"from": requested_title, "to": title})
+
+            if title not in self.server.pages:
+                pages.append({"title": title, "missing": True})
+            elif query["prop"][0] == "info":
+                # resolved like the API does with redirects=1
+                while "redirects" in query and self.server.pages.get(title, (0, ""))[1].startswith("#REDIRECT"):
+                    target = re.search(r"\[\[(.*?)\]\]", self.server.pages[title][1]).group(1)
+                    redirects.append({"from": title, "to": target})
+                    title = target
+
+                if title in self.server.pages:
+                    pages.append({"title": title, "lastrevid": self.server.pages[title][0]})
+                else:
+                    pages.append({"title": title, "missing": True})
+            else:
+                revid, content = self.server.pages[title]
+                pages.append(
+                    {
+                        "title": title,
+                        "revisions": [{"revid": revid, "slots": {"main": {"content": content}}}],
+                    }
+                )
+
+        body = {"query": {"pages": pages, "normalized": normalized, "redirects": redirects}}
+        self.send(200, json.dumps(body), "application/json")
+
+
+@pytest.fixture
+def wiki_server():
+    """
+    A local stand-in for Wikipedia.
+
+    Add pages to `pages` as title: (revision ID, content), known lists to `lists` as
+    path: [domains] and delays in seconds to `delays` as path: seconds. Known lists are sent
+    with `last_modified` as their Last-Modified header, and answered with 304 Not Modified
+    when it is sent back as If-Modified-Since. Pages whose content
+    starts with #REDIRECT are resolved by revision ID queries that ask for redirects.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WikiHandler)
+    server.daemon_threads = True
+    server.pages = {}
+    server.lists = {}
+    server.delays = {}
+    server.last_modified = "Mon, 01 Jan 2024 00:00:00 GMT"
+    server.requests = []
+    server.url = "http://%s:%d" % server.server_address
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def encode_reply(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode_reply(item) for item in value)
+
+    value = value.encode("utf-8")
+
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    def read_command(self) -> list:
+        line = self.rfile.readline()
+
+        if not line:
+            return None
+
+        arguments = []
+
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            arguments.append(self.rfile.read(length + 2)[:-2].decode("utf-8"))
+
+        return arguments
+
+    def handle(self):
+        data = self.server.data
+
+        while True:
+            command = self.read_command()
+
+            if command is None:
+                return
+
+            name, arguments = command[0].upper(), command[1:]
+            self.server.commands.append(name)
+
+            if self.server.slow_replies > 0:
+                self.server.slow_replies -= 1
+                time.sleep(self.server.delay)
+
+            if name == "SELECT":
+                reply = b"+OK\r\n"
+            elif name == "SADD":
+                members = data.setdefault(arguments[0], set())
+                reply = encode_reply(len(set(arguments[1:]) - members))
+                members.update(arguments[1:])
+            elif name == "SMEMBERS":
+                reply = encode_reply(sorted(data.get(arguments[0], set())))
+            elif name == "HSET":
+                fields = data.setdefault(arguments[0], {})
+                fields.update(zip(arguments[1::2], arguments[2::2]))
+                reply = encode_reply(len(arguments) // 2)
+            elif name == "HMGET":
+                fields = data.get(arguments[0], {})
+                reply = encode_reply([fields.get(field) for field in arguments[1:]])
+            elif name == "HGETALL":
+                fields = data.get(arguments[0], {})
+                reply = encode_reply([item for pair in fields.items() for item in pair])
+            elif name == "HINCRBY":
+                fields = data.setdefault(arguments[0], {})
+                fields[arguments[1]] = str(int(fields.get(arguments[1], 0)) + int(arguments[2]))
+                reply = encode_reply(int(fields[arguments[1]]))
+            elif name == "EXPIRE":
+                reply = encode_reply(1)
+            else:
+                reply = b"-ERR unknown command\r\n"
+
+            self.wfile.write(reply)
+
+
+@pytest.fixture
+def redis_server():
+    """
+    A Redis-compatible server that answers the commands used by RedisBackend.
+
+    Set `slow_replies` to delay that many replies by `delay` seconds.
+    """
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), FakeRedisHandler)
+    server.daemon_threads = True
+    server.data = {}
+    server.commands = []
+    server.slow_replies = 0
+    server.delay = 0.5
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def start_next_day(engine, monkeypatch) -> str:
+    """
+    Move the engine to tomorrow, as a new process sharing the same cache directory.
+    """
+    from disinfodomains.backends import FilesystemBackend
+
+    next_day = (datetime.datetime.now() + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+
+    monkeypatch.setattr(engine, "today", lambda: next_day)
+    engine.set_cache_backend(FilesystemBackend(engine.cache_backend.directory))
+
+    return next_day
+
+
+def classify_by_keyword(texts: list) -> list:
+    return ["negative" if "fake" in text.lower() else "positive" for text in texts]
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch, wiki_server):
+    """
+    The report engine with an empty cache, no known lists, a keyword sentiment classifier
+    in place of the transformer, and Wikipedia requests sent to `wiki_server`.
+    """
+    import requests
+
+    import disinfodomains.disinfodomains as engine
+    from disinfodomains.backends import FilesystemBackend
+
+    real_get = requests.get
+
+    def get(url, *args, **kwargs):
+        return real_get(url.replace(WIKIPEDIA, wiki_server.url), *args, **kwargs)
+
+    monkeypatch.setattr(engine.requests, "get", get)
+    monkeypatch.setattr(engine, "get_sentiments", classify_by_keyword)
+    monkeypatch.setattr(engine, "KNOWN_LISTS", {})
+    monkeypatch.setattr(engine, "report_cache", engine.OrderedDict())
+    monkeypatch.setattr(engine, "print", lambda *args, **kwargs: None, raising=False)
+
+    previous_backend = engine.cache_backend
+    engine.set_cache_backend(FilesystemBackend(str(tmp_path / "cache")))
+
+    yield engine
+
+    # background fills write to the cache backend, so they must finish before it is swapped back
+    if engine.background_executor is not None:
+        engine.background_executor.shutdown(wait=True)
+        engine.background_executor = None
+
+    engine.set_cache_backend(previous_backend)
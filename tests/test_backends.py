@@ -0,0 +1,190 @@
+import time
+
+import pytest
+
+from disinfodomains.backends import (
+    FilesystemBackend,
+    RedisBackend,
+    RedisConnection,
+    SQLiteBackend,
+)
+
+DAY = "2024-01-01"
+
+
+@pytest.fixture(params=["filesystem", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "filesystem":
+        return FilesystemBackend(str(tmp_path / "cache"))
+
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "cache.db"))
+
+    server = request.getfixturevalue("redis_server")
+
+    return RedisBackend(*server.server_address)
+
+
+def test_backend_round_trip(backend):
+    backend.set_fields(DAY, "categories", {"example.com": ["News"], "missing.org": None})
+    backend.set_fields(DAY, "categories", {"other.com": []})
+    backend.add_to_list(DAY, "example.com", ["Fake news websites"])
+    backend.add_to_list(DAY, "example.com", ["Fake news websites", "Hoaxes"])
+    backend.increment_fields(DAY, "hits", {"example.com": 2})
+    backend.increment_fields(DAY, "hits", {"example.com": 3, "other.com": 1})
+
+    assert backend.list_days() == [DAY]
+    assert backend.get_fields(DAY, "categories", ["example.com", "missing.org", "unknown.com"]) == {
+        "example.com": ["News"],
+        "missing.org": None,
+    }
+
+    hits, categories, missing = backend.get_values(
+        [(DAY, "hits"), (DAY, "example.com"), ("2023-12-31", "hits")]
+    )
+
+    assert hits == {"example.com": 5, "other.com": 1}
+    # lists are merged as sets, so their order is not kept
+    assert sorted(categories) == ["Fake news websites", "Hoaxes"]
+    assert missing is None
+
+    day = backend.load_day(DAY)
+
+    assert day["categories"] == {"example.com": ["News"], "missing.org": None, "other.com": []}
+    assert day["hits"] == {"example.com": 5, "other.com": 1}
+
+
+def test_backend_reads_many_fields_at_once(backend):
+    backend.set_fields(DAY, "categories", {"a.com": ["A"], "b.com": []})
+    backend.set_fields("2023-12-31", "revisions", {"a.com": {"A": 1}})
+
+    assert backend.get_many_fields(
+        [
+            (DAY, "categories", ["a.com", "b.com", "c.com"]),
+            (DAY, "revisions", ["a.com"]),
+            ("2023-12-31", "revisions", ["a.com"]),
+            ("2023-12-31", "categories", []),
+        ]
+    ) == [{"a.com": ["A"], "b.com": []}, {}, {"a.com": {"A": 1}}, {}]
+
+
+def test_filesystem_backend_replays_its_log(tmp_path):
+    backend = FilesystemBackend(str(tmp_path))
+
+    backend.set_fields(DAY, "sentiments", {"Hoaxes": "negative"})
+    backend.add_to_list(DAY, "example.com", ["Hoaxes"])
+    backend.increment_fields(DAY, "hits", {"example.com": 1})
+
+    assert FilesystemBackend(str(tmp_path)).load_day(DAY) == {
+        "sentiments": {"Hoaxes": "negative"},
+        "example.com": ["Hoaxes"],
+        "hits": {"example.com": 1},
+    }
+
+
+def test_filesystem_backend_compacts_and_evicts_days(tmp_path, monkeypatch):
+    monkeypatch.setattr("disinfodomains.backends.FILESYSTEM_COMPACT_ENTRIES", 3)
+
+    backend = FilesystemBackend(str(tmp_path), days_in_memory=2)
+    days = ["2024-01-01", "2024-01-02", "2024-01-03"]
+
+    for day in days:
+        for count in range(4):
+            backend.increment_fields(day, "hits", {"example.com": 1})
+
+    assert list(backend.days) == days[1:]
+    # the evicted day was folded into its JSON file
+    assert not (tmp_path / "2024-01-01.log").exists()
+
+    reloaded = FilesystemBackend(str(tmp_path))
+
+    assert reloaded.list_days() == days
+    assert all(reloaded.load_day(day)["hits"] == {"example.com": 4} for day in days)
+
+
+def test_filesystem_compaction_keeps_entries_from_other_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr("disinfodomains.backends.FILESYSTEM_COMPACT_ENTRIES", 3)
+
+    # two processes sharing one directory
+    first = FilesystemBackend(str(tmp_path))
+    second = FilesystemBackend(str(tmp_path))
+
+    first.set_fields(DAY, "categories", {"a.com": ["A"]})
+    second.set_fields(DAY, "categories", {"b.com": ["B"]})
+    second.increment_fields(DAY, "hits", {"b.com": 1})
+    # the first process's third write compacts the day
+    first.increment_fields(DAY, "hits", {"a.com": 1})
+    first.increment_fields(DAY, "hits", {"a.com": 1})
+
+    assert not (tmp_path / (DAY + ".log")).exists()
+    assert FilesystemBackend(str(tmp_path)).load_day(DAY) == {
+        "categories": {"a.com": ["A"], "b.com": ["B"]},
+        "hits": {"a.com": 2, "b.com": 1},
+    }
+    # the compacting process now sees the other process's writes
+    assert first.get_fields(DAY, "categories", ["b.com"]) == {"b.com": ["B"]}
+
+
+def test_redis_backend_pipelines_batched_reads(redis_server):
+    backend = RedisBackend(*redis_server.server_address)
+    backend.set_fields(DAY, "categories", {"a.com": ["A"], "b.com": ["B"], "c.com": ["C"]})
+
+    redis_server.commands.clear()
+
+    assert backend.get_fields(DAY, "categories", ["a.com", "b.com", "c.com"]) == {
+        "a.com": ["A"],
+        "b.com": ["B"],
+        "c.com": ["C"],
+    }
+    assert redis_server.commands == ["HMGET"]
+
+
+def test_redis_connection_retries_a_slow_reply_on_a_new_connection(redis_server):
+    connection = RedisConnection(*redis_server.server_address, timeout=0.2)
+
+    redis_server.slow_replies = 1
+
+    assert connection.pipeline([("SADD", "key", "a")]) == [1]
+    assert connection.pipeline([("SMEMBERS", "key")]) == [["a"]]
+
+
+def test_redis_connection_recovers_after_every_attempt_times_out(redis_server):
+    connection = RedisConnection(*redis_server.server_address, timeout=0.2)
+
+    redis_server.slow_replies = 2
+
+    with pytest.raises(OSError):
+        connection.pipeline([("SMEMBERS", "key")])
+
+    # late replies from the timed out connections must not be read as answers to new commands
+    time.sleep(redis_server.delay)
+
+    assert connection.pipeline([("SADD", "key", "a")]) == [1]
+    assert connection.pipeline([("SMEMBERS", "key")]) == [["a"]]
+
+
+def test_redis_connection_reconnects_after_the_server_closes_it(redis_server):
+    connection = RedisConnection(*redis_server.server_address)
+
+    connection.socket.shutdown(2)
+
+    assert connection.pipeline([("SADD", "key", "a")]) == [1]
+
+
+def test_redis_pipeline_timeout_covers_every_attempt(redis_server):
+    connection = RedisConnection(*redis_server.server_address)
+
+    redis_server.slow_replies = 1
+
+    start = time.monotonic()
+
+    with pytest.raises(OSError):
+        connection.pipeline([("SMEMBERS", "key")], timeout=0.2)
+
+    # a timeout is not retried once it has used up the time allowed
+    assert time.monotonic() - start < 0.4
+    assert redis_server.commands == ["SMEMBERS"]
+
+    time.sleep(redis_server.delay)
+
+    assert connection.pipeline([("SADD", "key", "a")]) == [1]
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from disinfodomains import cascade
+from disinfodomains.cascade import CascadeClassifier, calibrate_band
+
+NEUTRAL_WORDS = ["establishments", "companies", "websites", "journals", "magazines", "podcasts"]
+NEGATIVE_WORDS = ["fake news", "hoaxes", "conspiracy theories", "pseudoscience", "propaganda"]
+
+
+def make_categories() -> list:
+    # "fake" marks the categories the keyword classifier in conftest.py labels negative
+    categories = ["%d %s" % (year, word) for year in range(1990, 2020) for word in NEUTRAL_WORDS]
+    categories += ["fake %s in %d" % (word, year) for year in range(2000, 2020) for word in NEGATIVE_WORDS]
+
+    return categories
+
+
+@pytest.fixture
+def cascade_path(engine, tmp_path, monkeypatch):
+    path = str(tmp_path / "cascade.npz")
+
+    monkeypatch.setattr(cascade, "CASCADE_MODEL_PATH", path)
+    monkeypatch.setattr(cascade, "active_classifier", None)
+    monkeypatch.setattr(cascade, "active_classifier_version", None)
+    monkeypatch.setattr(engine, "load_sentiment_model", lambda: (None, None))
+
+    return path
+
+
+def test_calibrate_band_keeps_each_class_within_budget():
+    rng = np.random.default_rng(0)
+    labels = (rng.random(2000) < 0.3).astype(float)
+    # negatives score higher, with overlap between the classes
+    probabilities = np.clip(rng.normal(0.3 + 0.4 * labels, 0.15), 0, 1)
+
+    low, high = calibrate_band(probabilities, labels, target_agreement=0.95)
+
+    assert low < high
+    assert (labels[probabilities <= low]).sum() <= 0.05 * labels.sum()
+    assert (1 - labels[probabilities >= high]).sum() <= 0.05 * (1 - labels).sum()
+
+
+def test_classify_only_sends_uncertain_categories_to_the_transformer(engine, monkeypatch):
+    sent = []
+
+    def get_sentiments(texts):
+        sent.extend(texts)
+        return ["negative"] * len(texts)
+
+    monkeypatch.setattr(engine, "get_sentiments", get_sentiments)
+
+    weights = np.zeros(cascade.CASCADE_FEATURES)
+    classifier = CascadeClassifier(weights, bias=0.0, low=0.4, high=0.6)
+
+    # every category scores 0.5, inside the band
+    assert classifier.classify(["Hoaxes", "Companies"]) == ["negative", "negative"]
+    assert sent == ["Hoaxes", "Companies"]
+
+    sent.clear()
+    classifier.bias = -10.0
+
+    assert classifier.classify(["Hoaxes", "Companies"]) == ["positive", "positive"]
+    assert sent == []
+
+
+def test_calibrate_reports_out_of_sample_agreement(engine, cascade_path):
+    classifier, report = cascade.calibrate(make_categories(), 0.99, cascade_path)
+
+    assert report["categories"] == len(make_categories())
+    assert report["held_out"] + report["calibration"] < report["categories"]
+    assert report["cascade_agreement"] == 1.0
+    assert report["deferred_to_transformer"] < 0.5
+    assert classifier.low < classifier.high
+
+
+def test_recalibrating_changes_the_sentiment_fingerprint(engine, cascade_path, monkeypatch):
+    monkeypatch.setattr(engine, "SENTIMENT_CASCADE", True)
+
+    uncalibrated = engine.get_sentiment_fingerprint()
+    cascade.calibrate(make_categories(), 0.99, cascade_path)
+    calibrated = engine.get_sentiment_fingerprint()
+
+    assert cascade.classify_categories(["fake news in 2001"]) == {"fake news in 2001": "negative"}
+    assert cascade.active_classifier is not None
+
+    classifier, _ = cascade.calibrate(make_categories(), 0.9, cascade_path)
+
+    assert calibrated not in (uncalibrated, engine.get_sentiment_fingerprint())
+    # the next classification loads the new band
+    assert cascade.active_classifier is None
+
+    cascade.classify_categories(["fake news in 2001"])
+
+    assert (cascade.active_classifier.low, cascade.active_classifier.high) == (classifier.low, classifier.high)
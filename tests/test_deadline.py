@@ -0,0 +1,125 @@
+import time
+
+from conftest import WIKIPEDIA
+
+DEADLINE = 0.15
+# slack for thread scheduling and the local server
+DEADLINE_SLACK = 0.15
+KNOWN_LIST_PATH = "/wiki/List_of_fake_news_websites"
+
+
+def wait_for_background_fill(engine, timeout: float = 10):
+    stop_at = time.monotonic() + timeout
+
+    while engine.background_domains and time.monotonic() < stop_at:
+        time.sleep(0.01)
+
+
+def test_slow_page_returns_partial_report_at_the_deadline(engine, wiki_server):
+    wiki_server.pages["Slow.example"] = (1, "[[Category:Fake news websites]] [[Category:Satirical websites]]")
+    wiki_server.delays["/w/api.php"] = 0.5
+
+    start = time.monotonic()
+    report = engine.generate_report("slow.example", deadline=DEADLINE)
+    elapsed = time.monotonic() - start
+
+    assert elapsed < DEADLINE + DEADLINE_SLACK
+    assert report["completed_stages"] == ["known_lists", "cached_categories", "rules"]
+    assert report["skipped_stages"] == ["fetch", "sentiment", "consensus"]
+    assert report["all_categories"] == []
+
+    # the skipped stages finish in the background and fill today's cache
+    wait_for_background_fill(engine)
+    cache = engine.get_day_cache()
+
+    assert engine.get_cached_fields(cache, "categories", ["slow.example"]) == {
+        "slow.example": ["Fake news websites", "Satirical websites"]
+    }
+    assert engine.get_cached_sentiments(cache, ["Fake news websites"]) == {
+        "Fake news websites": "negative"
+    }
+
+    report = engine.generate_report("slow.example", deadline=DEADLINE)
+
+    assert report["skipped_stages"] == []
+    assert report["flagged_categories"] == ["Satire"]
+    assert report["negative_sentiment_categories"] == ["Fake news websites"]
+
+
+def test_slow_known_list_does_not_hide_cached_categories(engine, wiki_server, monkeypatch):
+    monkeypatch.setattr(engine, "KNOWN_LISTS", {WIKIPEDIA + KNOWN_LIST_PATH: "Domain"})
+    wiki_server.lists[KNOWN_LIST_PATH] = ["listed.example"]
+    wiki_server.delays[KNOWN_LIST_PATH] = 0.5
+
+    cache = engine.get_day_cache()
+    engine.save_to_cache(cache, {"cached.example": ["Fake news websites"]}, "categories")
+    engine.save_sentiments(cache, {"Fake news websites": "negative"})
+
+    start = time.monotonic()
+    report = engine.generate_report("cached.example", deadline=DEADLINE)
+    elapsed = time.monotonic() - start
+
+    assert elapsed < DEADLINE + DEADLINE_SLACK
+    # consensus reads past days from the cache backend, which is not done past the deadline
+    assert report["skipped_stages"] == ["known_lists", "consensus"]
+    assert report["all_categories"] == ["Fake news websites"]
+    assert report["negative_sentiment_categories"] == ["Fake news websites"]
+
+    # the list is fetched in the background, so the next report checks it in time
+    wait_for_background_fill(engine)
+
+    report = engine.generate_report("listed.example", deadline=DEADLINE)
+
+    assert "known_lists" in report["completed_stages"]
+    assert report["known_problematic_websites"] == ["listed.example"]
+
+
+def test_report_without_a_deadline_waits_for_slow_responses(engine, wiki_server):
+    wiki_server.pages["Slow.example"] = (1, "[[Category:Fake news websites]]")
+    wiki_server.delays["/w/api.php"] = 0.3
+
+    report = engine.generate_report("slow.example")
+
+    assert "skipped_stages" not in report
+    assert report["all_categories"] == ["Fake news websites"]
+
+
+def test_slow_redis_reply_does_not_hold_the_report(redis_server, engine):
+    from disinfodomains.backends import RedisBackend
+
+    engine.set_cache_backend(RedisBackend(*redis_server.server_address))
+    # today's cache is loaded once per process, before any report has a deadline
+    engine.get_day_cache()
+
+    # the next read, of today's categories, stalls for longer than the deadline
+    redis_server.slow_replies = 1
+    redis_server.delay = 1
+
+    start = time.monotonic()
+    report = engine.generate_report("slow.example", deadline=DEADLINE, use_report_cache=False)
+    elapsed = time.monotonic() - start
+
+    assert elapsed < DEADLINE + DEADLINE_SLACK
+    assert report["completed_stages"] == ["known_lists"]
+    assert "HMGET" in redis_server.commands
+
+
+def test_slow_redis_consensus_read_stops_at_the_deadline(redis_server, engine, wiki_server):
+    from disinfodomains.backends import RedisBackend
+
+    engine.set_cache_backend(RedisBackend(*redis_server.server_address))
+    wiki_server.pages["Fake.example"] = (1, "[[Category:Fake news websites]]")
+
+    # warm every stage but consensus, then stall the consensus read
+    engine.generate_report("fake.example", consensus=False, use_report_cache=False)
+    redis_server.slow_replies = 1
+    redis_server.delay = 1
+    redis_server.commands.clear()
+
+    start = time.monotonic()
+    report = engine.generate_report("fake.example", deadline=DEADLINE, use_report_cache=False)
+    elapsed = time.monotonic() - start
+
+    assert elapsed < DEADLINE + DEADLINE_SLACK
+    assert report["skipped_stages"] == ["consensus"]
+    assert report["negative_sentiment_categories"] == ["Fake news websites"]
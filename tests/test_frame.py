@@ -0,0 +1,42 @@
+import pandas as pd
+
+
+def test_score_frame_reads_the_consensus_strategy_when_called(engine, monkeypatch):
+    import disinfodomains.frame as frame
+
+    strategies = []
+
+    def get_consensus(domain, consensus_strategy):
+        strategies.append(consensus_strategy)
+        return []
+
+    monkeypatch.setattr(frame, "get_consensus", get_consensus)
+
+    cache = engine.get_day_cache()
+    engine.save_to_cache(cache, {"fake.example": ["Fake news websites"]}, "categories")
+    engine.save_sentiments(cache, {"Fake news websites": "negative"})
+
+    monkeypatch.setattr(engine, "CONSENSUS_STRATEGY", "unanimous")
+
+    scored = frame.score_frame(pd.DataFrame({"domain": ["https://www.fake.example/story"]}), fetch=False)
+
+    assert strategies == ["unanimous"]
+    assert scored["normalized_domain"].tolist() == ["fake.example"]
+    assert scored["all_categories"].tolist() == [["Fake news websites"]]
+
+
+def test_cached_sentiments_are_not_reused_after_the_threshold_changes(engine, monkeypatch):
+    cache = engine.get_day_cache()
+    engine.save_to_cache(cache, {"fake.example": ["Fake news websites"]}, "categories")
+    engine.save_sentiments(cache, {"Fake news websites": "negative"})
+
+    monkeypatch.setattr(engine, "SENTIMENT_CLASSIFIER_CONFIDENCE", 1.01)
+    monkeypatch.setattr(engine, "get_sentiments", lambda texts: ["positive"] * len(texts))
+
+    report = engine.generate_report("fake.example", consensus=False)
+
+    assert report["all_categories"] == ["Fake news websites"]
+    assert report["negative_sentiment_categories"] == []
+    assert engine.get_cached_sentiments(cache, ["Fake news websites"]) == {
+        "Fake news websites": "positive"
+    }
@@ -0,0 +1,81 @@
+import json
+import os
+import random
+import string
+
+import pytest
+
+from disinfodomains.known_filter import (
+    BloomFilter,
+    build_known_domains_filter,
+    write_known_domains_filter,
+)
+
+# positions checked against webext/background.js by webext/test/background.test.js
+POSITIONS_FIXTURE_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "webext", "test", "bloom_positions.json"
+)
+POSITION_DOMAINS = [
+    "example.com",
+    "infowars.com",
+    "naturalnews.com",
+    "a.co",
+    "xn--bcher-kva.example",
+    "bücher.example",
+    "very-long-subdomain.of.a.very-long-domain-name.example.org",
+]
+PROBES = 50000
+
+
+def random_domains(rng, count: int) -> set:
+    return {
+        "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 14)))
+        + rng.choice([".com", ".org", ".net", ".info"])
+        for _ in range(count)
+    }
+
+
+@pytest.mark.parametrize("count,false_positive_rate", [(1000, 0.001), (10000, 0.001), (3000, 0.01)])
+def test_observed_false_positive_rate_is_near_target(count, false_positive_rate):
+    rng = random.Random(count)
+    listed = random_domains(rng, count)
+    probes = random_domains(rng, PROBES) - listed
+
+    _, report = build_known_domains_filter(sorted(listed), (), false_positive_rate)
+    bloom = BloomFilter.for_capacity(count, false_positive_rate)
+
+    for domain in listed:
+        bloom.add(domain)
+
+    observed = sum(domain in bloom for domain in probes) / len(probes)
+
+    assert report["expected_false_positive_rate"] <= false_positive_rate
+    assert observed < 2 * false_positive_rate
+    assert all(domain in bloom for domain in listed)
+
+
+def test_size_is_a_power_of_two_within_the_budget():
+    assert BloomFilter.for_capacity(1000, 0.001).size == 16384
+    # 3,000 bytes is 24,000 bits, so the size is rounded down to fit
+    assert BloomFilter.for_capacity(10000, 0.001, size_budget=3000).size == 16384
+
+
+def get_positions() -> dict:
+    bloom = BloomFilter(1 << 20, 12)
+
+    return {
+        "size": bloom.size,
+        "hashes": bloom.hashes,
+        "positions": {domain: list(bloom._positions(domain)) for domain in POSITION_DOMAINS},
+    }
+
+
+def test_positions_fixture_matches_python():
+    # regenerate with: json.dump(get_positions(), f, indent=2)
+    with open(POSITIONS_FIXTURE_PATH, "r") as f:
+        assert json.load(f) == get_positions()
+
+
+def test_writing_to_a_missing_directory_fails_before_fetching(tmp_path):
+    with pytest.raises(FileNotFoundError, match="--output"):
+        write_known_domains_filter(str(tmp_path / "webext" / "known_domains.json"))
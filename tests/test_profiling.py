@@ -0,0 +1,60 @@
+import json
+import os
+import pstats
+
+from disinfodomains.profiling import compare_to_baseline, profile_corpus
+
+
+def test_profile_corpus_replays_recorded_responses(engine, wiki_server, tmp_path, monkeypatch):
+    wiki_server.pages["Fake.example"] = (1, "[[Category:Fake news websites]]")
+    fixtures_path = str(tmp_path / "fixtures.json")
+    output_directory = str(tmp_path / "results")
+    loads = []
+
+    def load_sentiment_model():
+        loads.append(True)
+        return None, None
+
+    monkeypatch.setattr(engine, "load_sentiment_model", load_sentiment_model)
+
+    profile_corpus(["fake.example"], output_directory, fixtures_path, record=True, trace_memory=False)
+
+    with open(fixtures_path) as f:
+        assert [url for url in json.load(f) if "titles=fake.example" in url]
+
+    wiki_server.requests.clear()
+
+    summary = profile_corpus(["fake.example"], output_directory, fixtures_path, trace_memory=False)
+
+    assert wiki_server.requests == []
+    assert summary["domains"] == 1
+    assert set(summary["stages"]) == set(engine.REPORT_STAGES)
+    assert summary["stages"]["fetch"]["seconds_per_domain"] > 0
+
+    for name in ("summary.json", "profile.prof", "functions.txt", "stacks.collapsed"):
+        assert os.path.exists(os.path.join(output_directory, name))
+
+    # the model is loaded before profiling starts, not during the first report
+    assert len(loads) == 2
+    profiled = pstats.Stats(os.path.join(output_directory, "profile.prof")).stats
+    assert not any(name == "load_sentiment_model" for _, _, name in profiled)
+
+
+def summary_of(**seconds_per_domain) -> dict:
+    return {"stages": {stage: {"seconds_per_domain": seconds} for stage, seconds in seconds_per_domain.items()}}
+
+
+def test_compare_to_baseline_reports_stages_slower_than_the_threshold():
+    baseline = summary_of(fetch=0.1, sentiment=0.2, consensus=0.05)
+    summary = summary_of(fetch=0.15, sentiment=0.22)
+
+    assert compare_to_baseline(summary, baseline, threshold=0.2) == ["fetch: 150.0 ms per domain, up from 100.0 ms"]
+
+
+def test_compare_to_baseline_compares_fast_stages_against_the_minimum():
+    baseline = summary_of(rules=0.0001)
+
+    assert compare_to_baseline(summary_of(rules=0.0005), baseline, threshold=0.2, min_seconds=0.001) == []
+    assert compare_to_baseline(summary_of(rules=0.002), baseline, threshold=0.2, min_seconds=0.001) == [
+        "rules: 2.0 ms per domain, up from 0.1 ms"
+    ]
@@ -0,0 +1,45 @@
+from conftest import start_next_day
+
+
+def test_redirect_map_is_kept_across_days(engine, wiki_server, monkeypatch):
+    wiki_server.pages["Redirect.example"] = (1, "#REDIRECT [[Fake news site]]")
+    wiki_server.pages["Fake news site"] = (2, "[[Category:Fake news websites]]")
+
+    report = engine.generate_report("redirect.example", use_report_cache=False)
+
+    assert report["all_categories"] == ["Fake news websites"]
+    assert engine.get_redirect_targets(["redirect.example"]) == {
+        "redirect.example": "Fake news site"
+    }
+
+    # the canonical page was edited, so it is fetched again on the next day
+    wiki_server.pages["Fake news site"] = (3, "[[Category:Fake news websites]] [[Category:Hoaxes]]")
+    next_day = start_next_day(engine, monkeypatch)
+    wiki_server.requests.clear()
+
+    report = engine.generate_report("redirect.example", use_report_cache=False)
+
+    assert report["all_categories"] == ["Fake news websites", "Hoaxes"]
+    # the redirect was revalidated in one batch and the canonical page fetched directly
+    assert len(wiki_server.requests) == 2
+    assert "prop=info&redirects=1" in wiki_server.requests[0]
+    assert "titles=Fake%20news%20site&" in wiki_server.requests[1]
+    assert "redirects" not in engine.get_day_cache()
+    assert next_day in engine.get_cache_days()
+    assert engine.REDIRECTS_CACHE not in engine.get_cache_days()
+
+
+def test_removed_redirect_is_invalidated_by_revalidation(engine, wiki_server, monkeypatch):
+    wiki_server.pages["Redirect.example"] = (1, "#REDIRECT [[Fake news site]]")
+    wiki_server.pages["Fake news site"] = (2, "[[Category:Fake news websites]]")
+
+    engine.generate_report("redirect.example", use_report_cache=False)
+
+    # the redirect became a page of its own
+    wiki_server.pages["Redirect.example"] = (3, "[[Category:Satirical websites]]")
+    start_next_day(engine, monkeypatch)
+
+    report = engine.generate_report("redirect.example", use_report_cache=False)
+
+    assert report["all_categories"] == ["Satirical websites"]
+    assert engine.get_redirect_targets(["redirect.example", "Redirect.example"]) == {}
@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+
+from conftest import WIKIPEDIA
+
+KNOWN_LIST_PATH = "/wiki/List_of_fake_news_websites"
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "example.com",
+        "WWW.Example.com",
+        "http://WWW.Example.com/a",
+        "https://www.EXAMPLE.com/story?id=1",
+        " Www.example.com ",
+    ],
+)
+def test_normalize_domain_matches_the_frame_normalizer(engine, url):
+    from disinfodomains.frame import normalize_domains
+
+    assert engine.normalize_domain(url) == "example.com"
+    assert normalize_domains(pd.Series([url])).tolist() == ["example.com"]
+
+
+def test_report_for_an_uppercase_www_url_checks_the_known_lists(engine, wiki_server, monkeypatch):
+    monkeypatch.setattr(engine, "KNOWN_LISTS", {WIKIPEDIA + KNOWN_LIST_PATH: "Domain"})
+    wiki_server.lists[KNOWN_LIST_PATH] = ["listed.example"]
+
+    report = engine.generate_report("http://WWW.Listed.example/story", consensus=False)
+
+    assert report["known_problematic_websites"] == ["listed.example"]
+
+
+def test_fast_verdict_stops_after_the_known_lists(engine, wiki_server, monkeypatch):
+    monkeypatch.setattr(engine, "KNOWN_LISTS", {WIKIPEDIA + KNOWN_LIST_PATH: "Domain"})
+    wiki_server.lists[KNOWN_LIST_PATH] = ["listed.example"]
+    wiki_server.pages["Listed.example"] = (1, "[[Category:Fake news websites]]")
+
+    report = engine.generate_report("listed.example", fast_verdict=True, deadline=10)
+
+    assert report["known_problematic_websites"] == ["listed.example"]
+    assert report["completed_stages"] == ["known_lists"]
+    assert report["all_categories"] == []
+    # no Wikipedia page lookups, and the partial report is not reused
+    assert wiki_server.requests == [KNOWN_LIST_PATH]
+    assert engine.get_cached_report("listed.example", engine.get_config_fingerprint(True)) is None
+
+
+def test_fast_verdict_runs_every_stage_for_an_unflagged_domain(engine, wiki_server, monkeypatch):
+    monkeypatch.setattr(engine, "KNOWN_LISTS", {WIKIPEDIA + KNOWN_LIST_PATH: "Domain"})
+    wiki_server.lists[KNOWN_LIST_PATH] = ["listed.example"]
+    wiki_server.pages["Other.example"] = (1, "[[Category:News websites]]")
+
+    report = engine.generate_report("other.example", fast_verdict=True, deadline=10)
+
+    assert report["completed_stages"] == list(engine.REPORT_STAGES)
+    assert report["all_categories"] == ["News websites"]
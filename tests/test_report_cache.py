@@ -0,0 +1,36 @@
+import re
+
+
+def refuse_to_classify(texts: list) -> list:
+    raise AssertionError("classified " + repr(texts))
+
+
+def test_cached_report_is_served_without_upstream_calls(engine, wiki_server, monkeypatch):
+    wiki_server.pages["Fake.example"] = (1, "[[Category:Fake news websites]] [[Category:Satirical websites]]")
+
+    report = engine.generate_report("fake.example")
+
+    wiki_server.requests.clear()
+    monkeypatch.setattr(engine, "get_sentiments", refuse_to_classify)
+
+    assert engine.generate_report("https://www.fake.example/story") == report
+
+    # a new process reads the report from the cache backend
+    engine.report_cache.clear()
+
+    assert engine.generate_report("fake.example") == report
+    assert wiki_server.requests == []
+
+
+def test_cached_report_is_not_used_after_the_configuration_changes(engine, wiki_server, monkeypatch):
+    wiki_server.pages["Fake.example"] = (1, "[[Category:Fake news websites]]")
+
+    report = engine.generate_report("fake.example")
+
+    assert report["flagged_categories"] == []
+
+    monkeypatch.setitem(engine.CATEGORIES_TO_FLAG, "Fake news", [re.compile(r"Fake news", re.IGNORECASE)])
+
+    report = engine.generate_report("fake.example")
+
+    assert report["flagged_categories"] == ["Fake news"]
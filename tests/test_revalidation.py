@@ -0,0 +1,80 @@
+from conftest import WIKIPEDIA, start_next_day
+
+
+def test_unchanged_page_from_yesterday_is_not_fetched_again(engine, wiki_server, monkeypatch):
+    wiki_server.pages["Fake.example"] = (1, "[[Category:Fake news websites]]")
+
+    engine.generate_report("fake.example", use_report_cache=False)
+
+    start_next_day(engine, monkeypatch)
+    wiki_server.requests.clear()
+
+    report = engine.generate_report("fake.example", use_report_cache=False)
+
+    assert report["all_categories"] == ["Fake news websites"]
+    # one batched revision ID check and no wikitext
+    assert len(wiki_server.requests) == 1
+    assert "prop=info" in wiki_server.requests[0]
+    assert engine.get_cached_fields(engine.get_day_cache(), "revisions", ["fake.example"]) == {
+        "fake.example": {"Fake.example": 1}
+    }
+
+
+def test_edited_page_from_yesterday_is_fetched_again(engine, wiki_server, monkeypatch):
+    wiki_server.pages["Fake.example"] = (1, "[[Category:Fake news websites]]")
+
+    engine.generate_report("fake.example", use_report_cache=False)
+
+    wiki_server.pages["Fake.example"] = (2, "[[Category:Satirical websites]]")
+    start_next_day(engine, monkeypatch)
+    wiki_server.requests.clear()
+
+    report = engine.generate_report("fake.example", use_report_cache=False)
+
+    assert report["all_categories"] == ["Satirical websites"]
+    assert ["prop=info" in path for path in wiki_server.requests] == [True, False]
+
+
+def test_previous_revisions_are_read_in_one_backend_request(engine, wiki_server, monkeypatch):
+    wiki_server.pages["Fake.example"] = (1, "[[Category:Fake news websites]]")
+
+    engine.generate_report("fake.example", use_report_cache=False)
+    start_next_day(engine, monkeypatch)
+
+    reads = []
+    get_many_fields = engine.cache_backend.get_many_fields
+
+    def record(requests, timeout=None):
+        reads.append(requests)
+        return get_many_fields(requests, timeout)
+
+    monkeypatch.setattr(engine.cache_backend, "get_many_fields", record)
+
+    previous_revisions = engine.get_previous_revisions(["fake.example", "other.example"])
+
+    assert previous_revisions == {
+        "fake.example": ({"Fake.example": 1}, ["Fake news websites"])
+    }
+    assert len(reads) == 1
+    assert len(reads[0]) == 2 * engine.REVALIDATION_DAYS
+
+
+def test_unmodified_known_list_from_yesterday_is_reused(engine, wiki_server, monkeypatch):
+    known_list_path = "/wiki/List_of_fake_news_websites"
+    monkeypatch.setattr(engine, "KNOWN_LISTS", {WIKIPEDIA + known_list_path: "Domain"})
+    wiki_server.lists[known_list_path] = ["listed.example"]
+
+    engine.generate_report("listed.example", use_report_cache=False)
+
+    # the server answers 304 Not Modified for its Last-Modified date, so this is not sent
+    wiki_server.lists[known_list_path] = ["unsent.example"]
+    start_next_day(engine, monkeypatch)
+    wiki_server.requests.clear()
+
+    report = engine.generate_report("listed.example", use_report_cache=False)
+
+    assert wiki_server.requests.count(known_list_path) == 1
+    assert report["known_problematic_websites"] == ["listed.example"]
+    assert engine.get_cached_fields(
+        engine.get_day_cache(), "known_lists", [WIKIPEDIA + known_list_path]
+    ) == {WIKIPEDIA + known_list_path: ["listed.example"]}
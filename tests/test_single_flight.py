@@ -0,0 +1,123 @@
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from conftest import WIKIPEDIA
+
+CALLERS = 1000
+KNOWN_LIST_URL = WIKIPEDIA + "/wiki/List_of_fake_news_websites"
+PAGE_CONTENT = "[[Category:Fake news websites]] [[Category:Satirical websites]]"
+# long enough for every caller to arrive while the first one is fetching
+FETCH_DELAY = 0.3
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.status_code = 200
+        self.text = text
+        self.headers = {}
+
+    def json(self):
+        return json.loads(self.text)
+
+
+@pytest.fixture
+def upstream(engine, monkeypatch):
+    """
+    Stubs for Wikipedia and the sentiment model that count every call.
+    """
+    calls = Counter()
+    lock = threading.Lock()
+
+    def get(url, *args, **kwargs):
+        with lock:
+            calls[url.split("&rvslots")[0]] += 1
+
+        time.sleep(FETCH_DELAY)
+
+        if url == KNOWN_LIST_URL:
+            return FakeResponse("<table><tr><th>Domain</th></tr><tr><td>listed.example</td></tr></table>")
+
+        page = {"title": "Example.com", "revisions": [{"revid": 1, "slots": {"main": {"content": PAGE_CONTENT}}}]}
+
+        return FakeResponse(json.dumps({"query": {"pages": [page]}}))
+
+    def get_sentiments(texts):
+        with lock:
+            calls["sentiments"] += 1
+
+        time.sleep(FETCH_DELAY)
+
+        return ["negative" if "fake" in text.lower() else "positive" for text in texts]
+
+    monkeypatch.setattr(engine.requests, "get", get)
+    monkeypatch.setattr(engine, "get_sentiments", get_sentiments)
+    monkeypatch.setattr(engine, "KNOWN_LISTS", {KNOWN_LIST_URL: "Domain"})
+
+    return calls
+
+
+def assert_fetched_once(calls):
+    assert calls == {
+        KNOWN_LIST_URL: 1,
+        WIKIPEDIA + "/w/api.php?action=query&prop=revisions&titles=example.com": 1,
+        "sentiments": 1,
+    }
+
+
+def assert_complete(report):
+    assert report["all_categories"] == ["Fake news websites", "Satirical websites"]
+    assert report["flagged_categories"] == ["Satire"]
+    assert report["negative_sentiment_categories"] == ["Fake news websites"]
+
+
+def test_concurrent_threads_share_one_fetch(engine, upstream):
+    barrier = threading.Barrier(CALLERS)
+    reports = []
+
+    def look_up():
+        barrier.wait()
+        # the report cache is skipped so every caller goes through the lookups
+        reports.append(engine.generate_report("example.com", consensus=False, use_report_cache=False))
+
+    threads = [threading.Thread(target=look_up) for _ in range(CALLERS)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert len(reports) == CALLERS
+    assert_fetched_once(upstream)
+
+    for report in reports:
+        assert_complete(report)
+
+
+def test_concurrent_async_reports_share_one_fetch(engine, upstream):
+    async def look_up_all():
+        # reports with and without consensus run on separate threads, but share lookups
+        return await asyncio.gather(
+            *[
+                engine.generate_report_async(
+                    "https://www.example.com/story/%d" % i,
+                    consensus=i % 2 == 0,
+                    use_report_cache=False,
+                )
+                for i in range(CALLERS)
+            ]
+        )
+
+    reports = asyncio.run(look_up_all())
+
+    assert len(reports) == CALLERS
+    assert_fetched_once(upstream)
+    assert engine.async_in_flight == {}
+
+    for report in reports:
+        assert_complete(report)
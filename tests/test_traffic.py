@@ -0,0 +1,52 @@
+import pytest
+
+from conftest import WIKIPEDIA
+from disinfodomains.traffic import TopK, TrafficCounter, extract_host
+
+KNOWN_LIST_PATH = "/wiki/List_of_fake_news_websites"
+
+
+def test_extract_host_from_proxy_and_dns_lines():
+    assert extract_host('10.0.0.1 - - "GET http://www.Example.com:8080/a HTTP/1.1" 200') == "example.com"
+    assert extract_host("1700000000.000 10 10.0.0.1 TCP_TUNNEL/200 0 CONNECT example.org:443 -") == "example.org"
+    assert extract_host("client 10.0.0.1#5353: query: example.net IN A +") == "example.net"
+    assert extract_host('10.0.0.1 - - "GET http://10.0.0.2/ HTTP/1.1" 200') is None
+
+
+def test_top_k_needs_at_least_one_domain():
+    with pytest.raises(ValueError):
+        TopK(0)
+
+
+def test_watched_domains_are_counted_outside_the_top_k():
+    counter = TrafficCounter(top_k=1, watched_domains={"rare.example"}, chunk_lines=10)
+
+    for _ in range(100):
+        counter.add("popular.example")
+
+    counter.add("rare.example")
+    counter.add("other.example")
+
+    assert counter.top.items() == [("popular.example", 100)]
+    assert counter.watched_items() == [("rare.example", 1)]
+
+
+def test_flagged_traffic_report_includes_listed_domains_in_the_long_tail(engine, wiki_server, monkeypatch, tmp_path):
+    from disinfodomains.traffic import flagged_traffic_report
+
+    monkeypatch.setattr(engine, "KNOWN_LISTS", {WIKIPEDIA + KNOWN_LIST_PATH: "Domain"})
+    wiki_server.lists[KNOWN_LIST_PATH] = ["listed.example"]
+
+    log = tmp_path / "access.log"
+    log.write_text(
+        "query: popular.example IN A\n" * 50
+        + "query: www.listed.example IN A\n" * 2
+        + "query: unlisted.example IN A\n"
+    )
+
+    flagged_domains, summary = flagged_traffic_report([str(log)], top_k=1, fetch=False)
+
+    assert [(domain["domain"], domain["hits"]) for domain in flagged_domains] == [("listed.example", 2)]
+    assert flagged_domains[0]["known_problematic_website"]
+    assert summary["checked_domains"] == 2
+    assert summary["known_problematic_domains_seen"] == 1
@@ -0,0 +1,62 @@
+from conftest import start_next_day
+
+
+def add_pages(wiki_server, domains: list):
+    for domain in domains:
+        wiki_server.pages[domain.capitalize()] = (1, "[[Category:Fake news websites]]")
+
+
+def test_warm_cache_fetches_the_most_hit_domains_within_the_budget(engine, wiki_server):
+    from disinfodomains.warm import warm_cache
+
+    domains = ["a.example", "b.example", "c.example"]
+    add_pages(wiki_server, domains)
+    engine.record_hit(engine.get_day_cache(), "c.example")
+
+    summary = warm_cache(domains, request_budget=2)
+
+    assert summary == {"warmed": 2, "revalidated": 0, "already_cached": 0, "over_budget": 1, "failed": 0}
+    assert set(engine.get_cached_fields(engine.get_day_cache(), "categories", domains)) == {
+        "c.example",
+        "a.example",
+    }
+
+
+def test_warm_cache_skips_domains_already_cached_today(engine, wiki_server):
+    from disinfodomains.warm import warm_cache
+
+    domains = ["a.example", "b.example"]
+    add_pages(wiki_server, domains)
+
+    engine.generate_report("a.example")
+    wiki_server.requests.clear()
+
+    assert warm_cache(domains) == {"warmed": 1, "revalidated": 0, "already_cached": 1, "over_budget": 0, "failed": 0}
+    assert not any("titles=a.example" in path for path in wiki_server.requests)
+
+    # running again does nothing
+    wiki_server.requests.clear()
+
+    assert warm_cache(domains) == {"warmed": 0, "revalidated": 0, "already_cached": 2, "over_budget": 0, "failed": 0}
+    assert wiki_server.requests == []
+
+
+def test_warm_cache_revalidates_unchanged_domains_from_yesterday(engine, wiki_server, monkeypatch):
+    from disinfodomains.warm import warm_cache
+
+    domains = ["a.example", "b.example"]
+    add_pages(wiki_server, domains)
+
+    warm_cache(domains)
+
+    wiki_server.pages["B.example"] = (2, "[[Category:Satirical websites]]")
+    start_next_day(engine, monkeypatch)
+
+    # revalidated domains do not count against the budget
+    summary = warm_cache(domains, request_budget=1)
+
+    assert summary == {"warmed": 1, "revalidated": 1, "already_cached": 0, "over_budget": 0, "failed": 0}
+    assert engine.get_cached_fields(engine.get_day_cache(), "categories", domains) == {
+        "a.example": ["Fake news websites"],
+        "b.example": ["Satirical websites"],
+    }
@@ -4,33 +4,219 @@ var problematic_category_regexes = [
     /mass media-related controversies/g,
 ];
 
-function get_from_cache (url) {
-    chrome.storage.local.get("misinformation_cache").then(function (data) {
-        if (data.misinformation_cache == null) {
-            return null;
-        }
-        var cache = JSON.parse(data.misinformation_cache);
+// one IndexedDB record per domain, kept for a day
+var CACHE_DATABASE_NAME = "misinformation_cache";
+var CACHE_STORE_NAME = "domains";
+var CACHE_TTL = 24 * 60 * 60 * 1000;
+
+// most recently used domains, kept in the service worker between events
+var MEMORY_CACHE_SIZE = 200;
+
+// chrome.tabs.onUpdated fires several times per navigation
+var UPDATE_DEBOUNCE_MS = 250;
+
+var MAX_REDIRECT_HOPS = 5;
+
+// compiled by `disinfodomains build-filter` from the Wikipedia known lists
+var KNOWN_DOMAINS_FILTER_PATH = "known_domains.json";
+var KNOWN_DOMAINS_CATEGORY = "List of fake news websites";
 
-        return cache[url];
+// 32-bit FNV-1a, mirrored in disinfodomains/known_filter.py
+var FNV_PRIME = 0x01000193;
+var FNV_OFFSET_BASIS = 0x811c9dc5;
+var FNV_SECOND_OFFSET_BASIS = 0x050c5d1f;
+
+var memory_cache = new Map();
+var in_flight_lookups = {};
+var pending_tab_updates = {};
+var cache_database = null;
+var known_domains_filter = null;
+
+function open_cache_database () {
+    if (cache_database != null) {
+        return cache_database;
+    }
+
+    cache_database = new Promise(function (resolve, reject) {
+        var request = indexedDB.open(CACHE_DATABASE_NAME, 1);
+
+        request.onupgradeneeded = function () {
+            request.result.createObjectStore(CACHE_STORE_NAME, { keyPath: "title" });
+        };
+        request.onsuccess = function () {
+            resolve(request.result);
+        };
+        request.onerror = function () {
+            cache_database = null;
+            reject(request.error);
+        };
     });
+
+    return cache_database;
 }
 
-function save_to_cache (url, data) {
-    chrome.storage.local.get("misinformation_cache").then(function (data) {
-        var cache = {};
+function get_from_memory_cache (title) {
+    if (!memory_cache.has(title)) {
+        return null;
+    }
+
+    // re-insert so the Map stays ordered from least to most recently used
+    var record = memory_cache.get(title);
+    memory_cache.delete(title);
+    memory_cache.set(title, record);
+
+    return record;
+}
+
+function save_to_memory_cache (title, record) {
+    memory_cache.delete(title);
+    memory_cache.set(title, record);
+
+    if (memory_cache.size > MEMORY_CACHE_SIZE) {
+        memory_cache.delete(memory_cache.keys().next().value);
+    }
+}
+
+function is_fresh (record) {
+    return record != null && Date.now() - record.saved_at < CACHE_TTL;
+}
+
+function get_from_cache (title) {
+    var record = get_from_memory_cache(title);
 
-        if (data.misinformation_cache != null) {
-            cache = JSON.parse(data.misinformation_cache);
+    if (record != null) {
+        if (is_fresh(record)) {
+            return Promise.resolve(record);
         }
+        memory_cache.delete(title);
+    }
 
-        cache[url] = data;
+    return open_cache_database().then(function (database) {
+        return new Promise(function (resolve, reject) {
+            var request = database
+                .transaction(CACHE_STORE_NAME, "readonly")
+                .objectStore(CACHE_STORE_NAME)
+                .get(title);
 
-        chrome.storage.local.set({ misinformation_cache: JSON.stringify(cache) }, function () {
-            console.log("Saved to cache");
+            request.onsuccess = function () {
+                if (!is_fresh(request.result)) {
+                    resolve(null);
+                    return;
+                }
+
+                save_to_memory_cache(title, request.result);
+                resolve(request.result);
+            };
+            request.onerror = function () {
+                reject(request.error);
+            };
+        });
+    }).catch(function (error) {
+        console.error("Error reading cache:", error);
+        return null;
+    });
+}
+
+function save_to_cache (title, data) {
+    var record = {
+        title: title,
+        categories: data.categories,
+        saved_at: Date.now(),
+    };
+
+    save_to_memory_cache(title, record);
+
+    return open_cache_database().then(function (database) {
+        return new Promise(function (resolve, reject) {
+            var transaction = database.transaction(CACHE_STORE_NAME, "readwrite");
+
+            transaction.objectStore(CACHE_STORE_NAME).put(record);
+
+            transaction.oncomplete = function () {
+                resolve(record);
+            };
+            transaction.onerror = function () {
+                reject(transaction.error);
+            };
         });
+    }).catch(function (error) {
+        console.error("Error saving to cache:", error);
+        return record;
     });
 }
 
+function load_known_domains_filter () {
+    if (known_domains_filter != null) {
+        return known_domains_filter;
+    }
+
+    known_domains_filter = fetch(chrome.runtime.getURL(KNOWN_DOMAINS_FILTER_PATH))
+        .then(response => response.json())
+        .then(data => {
+            var bits = Uint8Array.from(atob(data.bloom.bits), character => character.charCodeAt(0));
+
+            return {
+                size: data.bloom.size,
+                hashes: data.bloom.hashes,
+                bits: bits,
+                false_positives: new Set(data.false_positives),
+            };
+        })
+        .catch(error => {
+            console.log("No known domains filter:", error);
+            return null;
+        });
+
+    return known_domains_filter;
+}
+
+function fnv1a_32 (bytes, offset_basis) {
+    var result = offset_basis;
+
+    for (var i = 0; i < bytes.length; i++) {
+        result ^= bytes[i];
+        result = Math.imul(result, FNV_PRIME);
+    }
+
+    return result >>> 0;
+}
+
+// mirrors BloomFilter._positions in disinfodomains/known_filter.py
+function bloom_positions (filter, domain) {
+    var bytes = new TextEncoder().encode(domain);
+    var first = fnv1a_32(bytes, FNV_OFFSET_BASIS);
+    // an odd step shares no factor with the power of two size; >>> 0 keeps it unsigned
+    var step = (fnv1a_32(bytes, FNV_SECOND_OFFSET_BASIS) | 1) >>> 0;
+    var positions = [];
+
+    for (var i = 0; i < filter.hashes; i++) {
+        // first + i * step stays well below 2 ** 53, so this matches Python exactly
+        positions.push((first + i * step) % filter.size);
+    }
+
+    return positions;
+}
+
+function is_known_domain (filter, domain) {
+    if (filter == null || filter.false_positives.has(domain)) {
+        return false;
+    }
+
+    return bloom_positions(filter, domain).every(
+        position => (filter.bits[position >> 3] & (1 << (position & 7))) !== 0
+    );
+}
+
+function normalize_domain (domain) {
+    domain = domain.trim().toLowerCase();
+
+    if (domain.startsWith("www.")) {
+        domain = domain.slice(4);
+    }
+
+    return domain;
+}
+
 function match_page_categories_against_problematic_categories(categories) {
     var problematic = false;
 
@@ -53,39 +239,28 @@ function match_page_categories_against_problematic_categories(categories) {
     return problematic;
 }
 
-function get_categories(title) {
-    if (get_from_cache(title) != null) {
-        console.log("Using cache");
-        var data = get_from_cache(title);
-        var categories = data.categories;
-
-        if (match_page_categories_against_problematic_categories(categories)) {
-            chrome.action.setIcon({ path: "icon-yellow.png" });
-        }
-        return;
-    }
-
-    fetch("https://en.wikipedia.org/w/api.php?action=query&prop=revisions&titles=" + title + "&rvslots=*&rvprop=content&formatversion=2&format=json")
+function fetch_categories (title, hops) {
+    return fetch("https://en.wikipedia.org/w/api.php?action=query&prop=revisions&titles=" + title + "&rvslots=*&rvprop=content&formatversion=2&format=json")
         .then(response => response.json())
         .then(data => {
             var page = data.query.pages[0];
-            var is_missing = page.missing;
-            if (is_missing) {
-                // reset cache for current_page
-                chrome.storage.local.set({ current_page: null }, function () {
-                    console.log("Reset storage");
-                });
-                
+
+            // missing pages are cached as null so unknown hosts are only looked up once a day
+            if (page.missing) {
                 console.log("Page not found");
-                return;
+                return null;
             }
 
             var page_data = page.revisions[0].slots.main.content;
 
             if (page_data.startsWith("#REDIRECT")) {
-                var redirect_title = page_data.split("[[")[1].split("]]")[0];
-                get_categories(redirect_title);
-                return;
+                if (hops >= MAX_REDIRECT_HOPS) {
+                    console.log("Too many redirects");
+                    return null;
+                }
+
+                var redirect_title = page_data.split("[[")[1].split("]]")[0].split("#")[0];
+                return fetch_categories(redirect_title, hops + 1);
             }
 
             var categories = [];
@@ -98,21 +273,58 @@ function get_categories(title) {
                 categories.push(match[1]);
             }
 
-            save_to_cache(title, { categories: categories });
+            return categories;
+        });
+}
+
+function get_categories (title) {
+    // concurrent lookups of the same domain share one cache read and fetch
+    if (in_flight_lookups[title] != null) {
+        return in_flight_lookups[title];
+    }
 
-            if (match_page_categories_against_problematic_categories(categories)) {
-                chrome.action.setIcon({ path: "icon-yellow.png" });
+    var lookup = get_from_cache(title)
+        .then(function (record) {
+            if (record != null) {
+                console.log("Using cache");
+                return record.categories;
             }
 
-            // save categories ot "current_page" value
-            chrome.storage.local.set({ current_page: JSON.stringify(categories) }, function () {
-                console.log("Saved to storage");
+            return fetch_categories(title, 0).then(function (categories) {
+                return save_to_cache(title, { categories: categories }).then(function () {
+                    return categories;
+                });
             });
         })
-        .catch(error => console.error('Error:', error));
+        .finally(function () {
+            delete in_flight_lookups[title];
+        });
+
+    in_flight_lookups[title] = lookup;
+
+    return lookup;
 }
 
-chrome.tabs.onUpdated.addListener( function (tabId, changeInfo, tab) {
+function show_categories (categories) {
+    if (categories == null) {
+        // reset cache for current_page
+        chrome.storage.local.set({ current_page: null }, function () {
+            console.log("Reset storage");
+        });
+        return;
+    }
+
+    if (match_page_categories_against_problematic_categories(categories)) {
+        chrome.action.setIcon({ path: "icon-yellow.png" });
+    }
+
+    // save categories ot "current_page" value
+    chrome.storage.local.set({ current_page: JSON.stringify(categories) }, function () {
+        console.log("Saved to storage");
+    });
+}
+
+function check_active_tab () {
     // set page icon to icon-grey
     chrome.action.setIcon({ path: "icon-grey.png" });
 
@@ -128,7 +340,28 @@ chrome.tabs.onUpdated.addListener( function (tabId, changeInfo, tab) {
         } else {
             var domain = url.hostname;
 
-            get_categories(domain);
+            load_known_domains_filter()
+                .then(function (filter) {
+                    // listed domains are flagged without a network call
+                    if (is_known_domain(filter, normalize_domain(domain))) {
+                        chrome.action.setIcon({ path: "icon-yellow.png" });
+                        return [KNOWN_DOMAINS_CATEGORY];
+                    }
+
+                    return get_categories(domain);
+                })
+                .then(show_categories)
+                .catch(error => console.error('Error:', error));
         }
     });
-});
\ No newline at end of file
+}
+
+chrome.tabs.onUpdated.addListener( function (tabId, changeInfo, tab) {
+    // collapse the burst of events fired by a single navigation into one check
+    clearTimeout(pending_tab_updates[tabId]);
+
+    pending_tab_updates[tabId] = setTimeout(function () {
+        delete pending_tab_updates[tabId];
+        check_active_tab();
+    }, UPDATE_DEBOUNCE_MS);
+});
@@ -0,0 +1,241 @@
+// Loads background.js into a sandbox with mocked chrome.*, IndexedDB and fetch APIs,
+// then counts Wikipedia fetches per navigation.
+//
+// Run with `node --test webext/test` (Node 18 or later).
+const assert = require("node:assert");
+const fs = require("node:fs");
+const path = require("node:path");
+const test = require("node:test");
+const vm = require("node:vm");
+
+const BACKGROUND_PATH = path.join(__dirname, "..", "background.js");
+
+// an object store shared by every service worker created with the same stores object
+function mock_indexed_db (stores) {
+    function request (get_result) {
+        var request = {};
+
+        setTimeout(function () {
+            request.result = get_result();
+            request.onsuccess && request.onsuccess();
+        }, 0);
+
+        return request;
+    }
+
+    var database = {
+        createObjectStore (name) {
+            stores[name] = stores[name] || {};
+        },
+        transaction (name) {
+            var transaction = {
+                objectStore () {
+                    return {
+                        get: title => request(() => stores[name][title]),
+                        put (record) {
+                            stores[name][record.title] = record;
+                            setTimeout(() => transaction.oncomplete && transaction.oncomplete(), 0);
+                        },
+                    };
+                },
+            };
+
+            return transaction;
+        },
+    };
+
+    return {
+        open (name) {
+            return request(function () {
+                if (Object.keys(stores).length === 0) {
+                    database.createObjectStore("domains");
+                }
+
+                return database;
+            });
+        },
+    };
+}
+
+// starts a service worker with the given pages, returning its context and counters
+function start_worker (options) {
+    var worker = {
+        stores: options.stores || {},
+        pages: options.pages || {},
+        url: options.url,
+        fetches: [],
+        listener: null,
+        icons: [],
+    };
+
+    var chrome = {
+        runtime: { getURL: file => "chrome-extension://test/" + file },
+        storage: { local: { set (items, callback) { callback && callback(); } } },
+        action: { setIcon (details) { worker.icons.push(details.path); } },
+        tabs: {
+            onUpdated: { addListener (listener) { worker.listener = listener; } },
+            query (query, callback) { callback([{ url: worker.url }]); },
+        },
+    };
+
+    function fetch (url) {
+        if (url.startsWith("chrome-extension://")) {
+            return Promise.reject(new Error("no filter"));
+        }
+
+        var title = new URL(url).searchParams.get("titles");
+        worker.fetches.push(title);
+
+        var content = worker.pages[title];
+        var page = content == null
+            ? { title: title, missing: true }
+            : { title: title, revisions: [{ slots: { main: { content: content } } }] };
+
+        return Promise.resolve({ json: () => Promise.resolve({ query: { pages: [page] } }) });
+    }
+
+    worker.context = vm.createContext({
+        chrome: chrome,
+        indexedDB: mock_indexed_db(worker.stores),
+        fetch: fetch,
+        console: { log () {}, error: console.error },
+        setTimeout,
+        clearTimeout,
+        Date,
+        Map,
+        Set,
+        Promise,
+        URL,
+        JSON,
+        TextEncoder,
+        Uint8Array,
+        atob,
+    });
+
+    vm.runInContext(fs.readFileSync(BACKGROUND_PATH, "utf8"), worker.context);
+
+    return worker;
+}
+
+function sleep (ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+// fires the burst of onUpdated events Chrome sends for one navigation and waits for the check
+async function navigate (worker, url, tab_id) {
+    worker.url = url;
+
+    for (var status of ["loading", "loading", "complete", "complete", "complete"]) {
+        worker.listener(tab_id || 1, { status: status }, { url: url });
+    }
+
+    await sleep(worker.context.UPDATE_DEBOUNCE_MS + 100);
+}
+
+const PAGES = { "goop.com": "[[Category:Companies promoting pseudoscience]] [[Category:Companies]]" };
+
+test("a burst of onUpdated events for one navigation makes one fetch", async function () {
+    var worker = start_worker({ pages: PAGES });
+
+    await navigate(worker, "https://goop.com/article");
+
+    assert.deepStrictEqual(worker.fetches, ["goop.com"]);
+    assert.ok(worker.icons.includes("icon-yellow.png"));
+});
+
+test("repeat navigations to a domain are answered from memory", async function () {
+    var worker = start_worker({ pages: PAGES });
+
+    for (var i = 0; i < 10; i++) {
+        await navigate(worker, "https://goop.com/" + i);
+    }
+
+    assert.strictEqual(worker.fetches.length, 1);
+});
+
+test("a new service worker reads records saved in IndexedDB", async function () {
+    var stores = {};
+
+    await navigate(start_worker({ stores: stores, pages: PAGES }), "https://goop.com/");
+
+    var worker = start_worker({ stores: stores, pages: PAGES });
+    await navigate(worker, "https://goop.com/");
+
+    assert.strictEqual(worker.fetches.length, 0);
+    assert.ok(worker.icons.includes("icon-yellow.png"));
+});
+
+test("missing pages are cached", async function () {
+    var worker = start_worker({ pages: PAGES });
+
+    await navigate(worker, "https://unknown.example/");
+    await navigate(worker, "https://unknown.example/other");
+
+    assert.deepStrictEqual(worker.fetches, ["unknown.example"]);
+});
+
+test("records older than CACHE_TTL are fetched again", async function () {
+    var stores = {};
+
+    await navigate(start_worker({ stores: stores, pages: PAGES }), "https://goop.com/");
+
+    stores.domains["goop.com"].saved_at -= 25 * 60 * 60 * 1000;
+
+    var worker = start_worker({ stores: stores, pages: PAGES });
+    await navigate(worker, "https://goop.com/");
+
+    assert.strictEqual(worker.fetches.length, 1);
+});
+
+test("concurrent lookups of a domain share one fetch", async function () {
+    var worker = start_worker({ pages: PAGES });
+
+    var results = await Promise.all(
+        Array.from({ length: 20 }, () => worker.context.get_categories("goop.com"))
+    );
+
+    assert.strictEqual(worker.fetches.length, 1);
+    assert.ok(results.every(categories => categories.includes("Companies promoting pseudoscience")));
+});
+
+test("fetches per navigation across several domains", async function () {
+    var pages = {};
+    var domains = [];
+
+    for (var i = 0; i < 20; i++) {
+        domains.push("site" + i + ".example");
+        pages["site" + i + ".example"] = "[[Category:Websites]]";
+    }
+
+    var worker = start_worker({ pages: pages });
+    var navigations = 0;
+
+    worker.context.UPDATE_DEBOUNCE_MS = 20;
+
+    // every domain is visited three times, in two tabs
+    for (var round = 0; round < 3; round++) {
+        for (var j = 0; j < domains.length; j++) {
+            await navigate(worker, "https://" + domains[j] + "/" + round, 1 + (j % 2));
+            navigations++;
+        }
+    }
+
+    var fetches_per_navigation = worker.fetches.length / navigations;
+
+    console.log("fetches per navigation:", fetches_per_navigation.toFixed(3));
+    assert.strictEqual(worker.fetches.length, domains.length);
+});
+
+test("Bloom filter positions match disinfodomains/known_filter.py", function () {
+    // written by tests/test_known_filter.py, which checks it against the Python filter
+    var fixture = JSON.parse(fs.readFileSync(path.join(__dirname, "bloom_positions.json"), "utf8"));
+    var worker = start_worker({});
+
+    for (var [domain, positions] of Object.entries(fixture.positions)) {
+        assert.deepStrictEqual(
+            Array.from(worker.context.bloom_positions(fixture, domain)),
+            positions,
+            domain
+        );
+    }
+});